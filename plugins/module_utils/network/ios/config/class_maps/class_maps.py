@@ -17,7 +17,10 @@ necessary to bring the current configuration to its desired end-state is
 created.
 """
 
+import os
+
 from copy import deepcopy
+from itertools import chain
 
 from ansible.module_utils.six import iteritems
 from ansible_collections.ansible.netcommon.plugins.module_utils.network.common.utils import (
@@ -26,18 +29,56 @@ from ansible_collections.ansible.netcommon.plugins.module_utils.network.common.u
 from ansible_collections.ansible.netcommon.plugins.module_utils.network.common.rm_base.resource_module import (
     ResourceModule,
 )
+from ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.class_maps.class_maps import (
+    FETCH_NAMES_ENV,
+    Class_mapsFacts,
+)
 from ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.facts import Facts
 from ansible_collections.cisco.ios.plugins.module_utils.network.ios.rm_templates.class_maps import (
+    VALUE_SETS,
     Class_mapsTemplate,
+    class_map_fingerprint,
+    class_map_key,
+    dscp_mask,
+    fork_context,
+    mask_dscp_values,
+    mask_values,
+    match_key,
+    values_mask,
 )
 from syslog import syslog
 
+# environment variable enabling the parallel diff, the number of worker
+# processes diffing the class-maps, unset or below 2 diffs them serially
+DIFF_PROCESSES_ENV = "ANSIBLE_IOS_CLASS_MAPS_DIFF_PROCESSES"
+
+# the Class_maps and the (want, have) pairs inherited by the worker processes
+_worker = {}
+
+
+def _init_worker(class_maps, pairs):
+    _worker["class_maps"] = class_maps
+    _worker["pairs"] = pairs
+
+
+def _diff_shard(bounds):
+    """The commands of a shard of the (want, have) pairs, in a worker process"""
+    start, stop = bounds
+    class_maps = _worker["class_maps"]
+    class_maps.commands = []
+    for want, have in _worker["pairs"][start:stop]:
+        class_maps._diff(want, have)
+    return class_maps.commands
+
 
 class Class_maps(ResourceModule):
     """
     The ios_class_maps config class
     """
 
+    # (want, have) pairs diffed by a worker process at a time
+    SHARD_SIZE = 500
+
     def __init__(self, module):
         super(Class_maps, self).__init__(
             empty_fact_val={},
@@ -77,6 +118,45 @@ class Class_maps(ResourceModule):
             "match vlan inner",
             "match traffic category",
         ]
+        # option of a match -> the match parsers comparing it, in match_parsers order
+        self.match_parser_index = {}
+        for parser in self.match_parsers:
+            compval = self._tmplt.get_parser(parser).get("compval") or parser
+            self.match_parser_index.setdefault(compval, []).append(parser)
+        self.match_parser_order = dict((parser, i) for i, parser in enumerate(self.match_parsers))
+        self._processes = int(os.environ.get(DIFF_PROCESSES_ENV) or 0)
+
+    def get_facts(self, empty_val=None, data=None):
+        """ The class-maps of the device, only the ones of `config` with
+            FETCH_NAMES_ENV set and at most that many of them
+        """
+        names = self._wanted_names()
+        if names is None:
+            return super(Class_maps, self).get_facts(empty_val, data=data)
+        facts = {"ansible_network_resources": {}}
+        Class_mapsFacts(self._module, names=names).populate_facts(self._connection, facts, data)
+        return facts["ansible_network_resources"].get("class_maps") or empty_val
+
+    def _wanted_names(self):
+        """ The names of the class-maps of `config` when only those are
+            compared, None when all the class-maps of the device are
+        """
+        # read here, the facts are gathered by ResourceModule.__init__()
+        fetch_names = int(os.environ.get(FETCH_NAMES_ENV) or 0)
+        if not fetch_names or self.state not in ["merged", "replaced", "deleted", "gathered"]:
+            return None
+        names = set(entry["name"] for entry in self._module.params.get("config") or [])
+        if not names or len(names) > fetch_names:
+            return None
+        return names
+
+    def run_commands(self):
+        """ Send the commands to the device, the cached class-maps of the
+            device are dropped first so the `after` facts are fetched
+        """
+        if self.commands and self.state in self.ACTION_STATES and not self._module.check_mode:
+            Class_mapsFacts(self._module).forget_device(self._connection)
+        super(Class_maps, self).run_commands()
 
     def execute_module(self):
         """ Execute the module
@@ -87,7 +167,12 @@ class Class_maps(ResourceModule):
         if self.state not in ["parsed", "gathered"]:
             self.generate_commands()
             self.run_commands()
-        return self.result
+        result = self.result
+        if self.state == "gathered":
+            result["fingerprints"] = dict(
+                (entry["name"], class_map_fingerprint(entry)) for entry in self.before
+            )
+        return result
 
     def generate_commands(self):
         """ Generate configuration commands to send based on
@@ -96,40 +181,99 @@ class Class_maps(ResourceModule):
         wantd = {entry["name"]: entry for entry in self.want}
         haved = {entry["name"]: entry for entry in self.have}
 
-        # if state is merged, merge want onto have and then compare
+        # if state is merged, merge want onto have and then compare,
+        # the class-maps that aren't in want are left as they are
         if self.state == "merged":
-            wantd = dict_merge(haved, wantd)
+            wantd = {
+                k: dict_merge(haved[k], want) if k in haved else want
+                for k, want in iteritems(wantd)
+            }
 
         # if state is deleted, empty out wantd and set haved to wantd
         if self.state == "deleted":
             haved = {k: v for k, v in iteritems(haved) if k in wantd or not wantd}
             wantd = {}
 
+        # the (want, have) pairs of class-maps to diff, in the order of their commands
+        pairs = []
+
         # remove superfluous config for overridden and deleted
         if self.state in ["overridden", "deleted"]:
             for k, have in iteritems(haved):
                 if k not in wantd:
-                    self._compare(want={}, have=have)
+                    pairs.append(({}, have))
 
         for k, want in iteritems(wantd):
-            self._compare(want=want, have=haved.pop(k, {}))
+            pairs.append((want, haved.pop(k, {})))
+
+        self.commands = []
+        self._diff_pairs(pairs)
+
+    def _diff_pairs(self, pairs):
+        """ Add the commands of every (want, have) pair, in the order of the pairs
+
+            With DIFF_PROCESSES_ENV set to 2 or more, and more than SHARD_SIZE
+            pairs, shards of the pairs are diffed by a pool of processes. The
+            class-maps are diffed independently of each other, so the commands
+            are the same as the serial ones.
+        """
+        context = fork_context()
+        if self._processes < 2 or len(pairs) <= self.SHARD_SIZE or context is None:
+            for want, have in pairs:
+                self._diff(want, have)
+            return
+        shards = [
+            (start, start + self.SHARD_SIZE) for start in range(0, len(pairs), self.SHARD_SIZE)
+        ]
+        # the workers are forked with the pairs, only the commands are sent back
+        pool = context.Pool(self._processes, _init_worker, (self, pairs))
+        try:
+            for commands in pool.imap(_diff_shard, shards):
+                self.commands.extend(commands)
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def _diff(self, want, have):
+        """ The commands of a class-map, see `_compare()`
+        """
+        # a class-map with the same content as the device's needs no commands,
+        # the key of the want is taken with its matches normalized
+        if have:
+            for wm in want.get("matches") or []:
+                self._validate_match(wm)
+            if class_map_key(want) == class_map_key(have):
+                return []
+        return self._compare(want=want, have=have)
 
     def _compare(self, want, have):
         """Leverages the base class `compare()` method and
            populates the list of commands to be run by comparing
            the `want` and `have` data with the `parsers` defined
            for the Class_maps network resource.
-        """
 
+           The commands of the class-map are collected in a list of their
+           own, added to `self.commands` at the end and returned.
+        """
+        # compare() adds the commands to self.commands, which holds the ones
+        # of the class-map while they are generated
+        generated, self.commands = self.commands, []
+        try:
+            commands = self._compare_class_map(want, have)
+        finally:
+            self.commands = generated
+        self.commands.extend(commands)
+        return commands
+
+    def _compare_class_map(self, want, have):
+        """ The commands of a class-map, generated in an empty `self.commands`
+        """
         # compare class-map headers
-        begin = len(self.commands)
-        before_len = len(self.commands)
-
         self.compare(parsers=self.class_map_parsers, want=want, have=have)
 
         class_map_cmd = None
-        if before_len != len(self.commands):
-            class_map_cmd = self.commands[len(self.commands) - 1]
+        if self.commands:
+            class_map_cmd = self.commands[-1]
 
         # compare class-map descriptions
         before_len = len(self.commands)
@@ -153,20 +297,25 @@ class Class_maps(ResourceModule):
         if have and have.get("matches"):
             have_matches = have.get("matches")
 
+        # the matches are indexed by their keys, with the value sets as bitmasks,
+        # a key maps to the first of the matches equal to each other
+        have_keys = [match_key(hm) for hm in have_matches]
+        have_index = {}
+        for hm, key in zip(have_matches, have_keys):
+            have_index.setdefault(key, hm)
+        want_index = {}
         for wm in want_matches:
             self._validate_match(wm)
-            hm = {}
-            if have_matches.count(wm) > 0:
-                hm = have_matches[have_matches.index(wm)]
-            self.compare(parsers=self.match_parsers, want=wm, have=hm)
+            key = match_key(wm)
+            want_index.setdefault(key, wm)
+            hm = have_index.get(key, {})
+            self.compare(parsers=self._select_match_parsers(wm, hm), want=wm, have=hm)
 
         # some matches have to be deleted if the class-map is not deleted, but we have "have" matches
         if class_map_cmd is None or class_map_cmd.startswith("class-map"):
-            for hm in have_matches:
-                wm = {}
-                if want_matches.count(hm) > 0:
-                    wm = want_matches[want_matches.index(hm)]
-                self.compare(parsers=self.match_parsers, want=wm, have=hm)
+            for hm, key in zip(have_matches, have_keys):
+                wm = want_index.get(key, {})
+                self.compare(parsers=self._select_match_parsers(wm, hm), want=wm, have=hm)
 
         # remove description command, if the class-map is going to be deleted
         elif class_map_cmd.startswith("no class-map") and description_cmd is not None:
@@ -178,16 +327,31 @@ class Class_maps(ResourceModule):
             description_cmd is not None or before_len < len(self.commands)
         ) and class_map_cmd is None:
             new_class_map_cmd = "class-map {0} {1}".format(want["match_type"], want["name"])
-            self.commands.insert(begin, new_class_map_cmd)
+            self.commands.insert(0, new_class_map_cmd)
 
-    def _validate_match(self, match):
-        if match.get("cos"):
-            match["cos"] = list(set(match.get("cos")))
-            match["cos"].sort()
+        return self.commands
+
+    def _select_match_parsers(self, want, have):
+        """The match parsers comparing the options of the want and have matches
 
-        if match.get("cos_inner"):
-            match["cos_inner"] = list(set(match.get("cos_inner")))
-            match["cos_inner"].sort()
+        A parser compares a single option, so the ones of the options in neither
+        match can't generate a command. They are left out, the others are kept
+        in the order of `match_parsers`.
+        """
+        parsers = set()
+        for option in chain(want, have):
+            parsers.update(self.match_parser_index.get(option, []))
+        return sorted(parsers, key=self.match_parser_order.get)
+
+    def _validate_match(self, match):
+        # the value sets are normalized through their bitmasks
+        for option, size in iteritems(VALUE_SETS):
+            if match.get(option):
+                mask = values_mask(match[option], size)
+                if mask is None:
+                    match[option] = sorted(set(match[option]))
+                else:
+                    match[option] = mask_values(mask)
 
         if match.get("destination_mac_address"):
             match["destination_mac_address"] = (
@@ -196,19 +360,17 @@ class Class_maps(ResourceModule):
 
         if match.get("dscp"):
             dscp_values = match.get("dscp").get("dscp_values")
-            for i in range(len(dscp_values)):
-                if Class_mapsTemplate.DSCP_VALUES.get(dscp_values[i], None) is not None:
-                    dscp_values[i] = Class_mapsTemplate.DSCP_VALUES.get(dscp_values[i])
-            match["dscp"]["dscp_values"] = list(set(filter(lambda v: v is not None, dscp_values)))
-            match["dscp"]["dscp_values"].sort()
-
-        if match.get("ip_precedence"):
-            match["ip_precedence"] = list(set(match.get("ip_precedence")))
-            match["ip_precedence"].sort()
-
-        if match.get("mpls_experimental_topmost"):
-            match["mpls_experimental_topmost"] = list(set(match.get("mpls_experimental_topmost")))
-            match["mpls_experimental_topmost"].sort()
+            mask = dscp_mask(dscp_values) if dscp_values else None
+            if mask is not None:
+                match["dscp"]["dscp_values"] = mask_dscp_values(mask)
+            else:
+                for i in range(len(dscp_values)):
+                    if Class_mapsTemplate.DSCP_VALUES.get(dscp_values[i], None) is not None:
+                        dscp_values[i] = Class_mapsTemplate.DSCP_VALUES.get(dscp_values[i])
+                match["dscp"]["dscp_values"] = list(
+                    set(filter(lambda v: v is not None, dscp_values))
+                )
+                match["dscp"]["dscp_values"].sort()
 
         if match.get("source_mac_address"):
             match["source_mac_address"] = match.get("source_mac_address").upper().replace(":", ".")
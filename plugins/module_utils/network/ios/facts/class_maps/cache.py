@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+# Copyright 2023 Red Hat
+# GNU General Public License v3.0+
+# (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+
+
+__metaclass__ = type
+
+"""
+The on-disk cache of the parsed class-maps. Parsing the same class-map
+partition again, e.g. in the gathered, parsed and check mode runs of a
+pipeline, reads the result from a local directory instead.
+
+The cache is enabled by setting ANSIBLE_IOS_CLASS_MAPS_CACHE_DIR. Every
+entry is a JSON file named by the hash of the parser version and the
+configuration text. The least recently used entries are removed, when the
+entries take more than ANSIBLE_IOS_CLASS_MAPS_CACHE_SIZE bytes.
+"""
+
+import errno
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+
+from contextlib import contextmanager
+
+from ansible.module_utils._text import to_bytes
+
+
+CACHE_DIR_ENV = "ANSIBLE_IOS_CLASS_MAPS_CACHE_DIR"
+CACHE_SIZE_ENV = "ANSIBLE_IOS_CLASS_MAPS_CACHE_SIZE"
+DEFAULT_CACHE_SIZE = 64 * 1024 * 1024
+
+
+class ParseCache(object):
+    """A directory of parse results shared by concurrent processes"""
+
+    LOCK_FILE = ".lock"
+    SUFFIX = ".json"
+
+    def __init__(self, path, max_size=DEFAULT_CACHE_SIZE):
+        self.path = path
+        self.max_size = max_size
+
+    @classmethod
+    def from_env(cls):
+        """Create the cache configured by the environment
+
+        :rtype: ParseCache
+        :returns: the cache, or None if it is not enabled
+        """
+        path = os.environ.get(CACHE_DIR_ENV)
+        if not path:
+            return None
+        max_size = int(os.environ.get(CACHE_SIZE_ENV) or DEFAULT_CACHE_SIZE)
+        return cls(os.path.expanduser(path), max_size)
+
+    @staticmethod
+    def key(text, version):
+        """The key of a parse result
+
+        :param text: the parsed configuration
+        :param version: the version of the parser
+        :rtype: str
+        :returns: the hex digest of the version and the text
+        """
+        digest = hashlib.sha256(to_bytes(version, errors="surrogate_or_strict"))
+        digest.update(b"\0")
+        digest.update(to_bytes(text, errors="surrogate_or_strict"))
+        return digest.hexdigest()
+
+    def _entry(self, key):
+        return os.path.join(self.path, key + self.SUFFIX)
+
+    @contextmanager
+    def _locked(self):
+        with open(os.path.join(self.path, self.LOCK_FILE), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def get(self, key):
+        """Read a parse result
+
+        Entries are replaced atomically, so they are read without the lock.
+        An entry that can't be read, e.g. it was just evicted, is a miss.
+
+        :param key: the key of the parse result
+        :returns: the parse result, or None
+        """
+        entry = self._entry(key)
+        try:
+            with open(entry) as f:
+                value = json.load(f)
+            # the modification time orders the entries for the eviction
+            os.utime(entry, None)
+        except (IOError, OSError, ValueError):
+            return None
+        return value
+
+    def set(self, key, value):
+        """Store a parse result
+
+        Results JSON can't represent exactly are not stored. Failing to
+        store a result is not an error, the cache is only an optimization.
+
+        :param key: the key of the parse result
+        :param value: the parse result
+        """
+        try:
+            data = json.dumps(value)
+            if json.loads(data) != value:
+                return
+        except (TypeError, ValueError):
+            return
+        if len(data) > self.max_size:
+            return
+        try:
+            self._makedirs()
+            with self._locked():
+                fd, tmp = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+                try:
+                    with os.fdopen(fd, "w") as f:
+                        f.write(data)
+                    os.rename(tmp, self._entry(key))
+                except Exception:
+                    os.unlink(tmp)
+                    raise
+                self._evict()
+        except (IOError, OSError):
+            pass
+
+    def delete(self, key):
+        """Remove a parse result
+
+        Removing an entry that is not stored is not an error.
+
+        :param key: the key of the parse result
+        """
+        try:
+            os.unlink(self._entry(key))
+        except (IOError, OSError):
+            pass
+
+    def _makedirs(self):
+        try:
+            os.makedirs(self.path, 0o700)
+        except OSError as exc:
+            if exc.errno != errno.EEXIST or not os.path.isdir(self.path):
+                raise
+
+    def _evict(self):
+        """Remove the least recently used entries over the size limit
+
+        Must be called with the lock held.
+        """
+        entries = []
+        for name in os.listdir(self.path):
+            if name.endswith(self.SUFFIX):
+                try:
+                    stat = os.stat(os.path.join(self.path, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+        size = sum(entry[1] for entry in entries)
+        for _mtime, entry_size, name in sorted(entries):
+            if size <= self.max_size:
+                break
+            try:
+                os.unlink(os.path.join(self.path, name))
+            except OSError:
+                continue
+            size -= entry_size
@@ -16,28 +16,138 @@ for a given resource, parsed, and the facts tree is populated
 based on the configuration.
 """
 
+import os
+
 from copy import deepcopy
+from itertools import islice
 
-from ansible.module_utils.six import iteritems
+from ansible.module_utils.connection import ConnectionError
 from ansible_collections.ansible.netcommon.plugins.module_utils.network.common import utils
 from ansible_collections.cisco.ios.plugins.module_utils.network.ios.rm_templates.class_maps import (
+    PARSER_VERSION,
     Class_mapsTemplate,
+    iter_lines,
 )
 from ansible_collections.cisco.ios.plugins.module_utils.network.ios.argspec.class_maps.class_maps import (
     Class_mapsArgs,
 )
+from ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.class_maps.cache import (
+    ParseCache,
+)
+
+# environment variable of the most class-maps fetched one by one when only
+# some of them are gathered, unset or 0 gathers them all from the partition
+FETCH_NAMES_ENV = "ANSIBLE_IOS_CLASS_MAPS_FETCH_NAMES"
+
+# environment variable enabling the change probe, with the cache enabled the
+# class-maps of a device whose config didn't change are read from the cache
+PROBE_ENV = "ANSIBLE_IOS_CLASS_MAPS_PROBE"
 
 
 class Class_mapsFacts(object):
     """ The ios class_maps facts class
     """
 
-    def __init__(self, module, subspec="config", options="options"):
+    # number of parsed class-maps validated at once
+    BATCH_SIZE = 100
+
+    # the header lines of the running config changed by every config change
+    # and by every write of the startup config. The device still renders its
+    # whole running config to filter them, the probe only saves the transfer
+    # and the parsing of the class-maps. The times in these lines are in
+    # seconds, a change made in the same second as the last change seen by
+    # the previous run isn't told apart from it
+    PROBE_COMMAND = "show running-config | include configuration change|NVRAM config last updated"
+
+    def __init__(self, module, subspec="config", options="options", names=None):
         self._module = module
         self.argument_spec = Class_mapsArgs.argument_spec
+        self._cache = ParseCache.from_env()
+        self.counters = {"cached": 0, "parsed": 0}
+        # the class-maps gathered, None gathers all of them
+        self.names = None if names is None else frozenset(names)
+        self._fetch_names = int(os.environ.get(FETCH_NAMES_ENV) or 0)
+
+    def _device(self, connection):
+        """ The device of the connection, as `user@host:port`
+
+        The device is told apart by its address, port and remote user, the
+        socket of the connection changes with every playbook run and the
+        inventory name of the host isn't passed to the modules.
+
+        :param connection: the device connection
+        :rtype: str
+        :returns: the device, or None without a connection or its address
+        """
+        if connection is None:
+            return None
+        try:
+            host, port, user = (
+                connection.get_option(option) for option in ("host", "port", "remote_user")
+            )
+        except ConnectionError as exc:
+            self._module.debug("device of the connection not known: {0}".format(exc))
+            return None
+        if not host:
+            return None
+        return "{0}@{1}:{2}".format(user or "", host, port or "")
+
+    def _cache_scope(self, connection):
+        # the device, the class-map blocks of a `parsed` run are kept apart
+        return self._device(connection) or "parsed"
+
+    def _device_key(self, connection):
+        """ The cache key of the class-maps of the device on the last run
+
+        :param connection: the device connection
+        :rtype: str
+        :returns: the key, or None without the cache or the device address
+        """
+        if not self._cache or connection is None:
+            return None
+        device = self._device(connection)
+        if device is None:
+            return None
+        return self._cache.key(device, PARSER_VERSION + "-device")
+
+    def forget_device(self, connection):
+        """ Drop the cached class-maps of the device, the change probe can't
+            see a change made within the second of the cached one
+
+        :param connection: the device connection
+        """
+        device_key = self._device_key(connection)
+        if device_key:
+            self._cache.delete(device_key)
+
+    def _probe(self, connection):
+        """ Read the change indicator of the device
+
+        :param connection: the device connection
+        :rtype: str
+        :returns: the indicator, or None if it couldn't be read
+        """
+        try:
+            indicator = connection.get(self.PROBE_COMMAND)
+        except ConnectionError as exc:
+            self._module.debug("class-map change probe failed: {0}".format(exc))
+            return None
+        return indicator if indicator.strip() else None
 
     def get_class_map_data(self, connection):
         # Get information about each type of class-map
+        if self.names is not None and len(self.names) <= self._fetch_names:
+            # a few class-maps are fetched by name, in a time independent of
+            # the size of the partition
+            try:
+                return "\n".join(
+                    connection.get("show running-config class-map {0}".format(name))
+                    for name in sorted(self.names)
+                )
+            except ConnectionError as exc:
+                self._module.debug(
+                    "class-maps not fetched by name, fetching the partition: {0}".format(exc)
+                )
         return connection.get("show running-config partition class-map")
 
     def populate_facts(self, connection, ansible_facts, data=None):
@@ -50,61 +160,86 @@ class Class_mapsFacts(object):
         :rtype: dictionary
         :returns: facts
         """
-        facts = {}
-        objs = []
-
+        device_key = indicator = None
         if not data:
+            device_key = self._device_key(connection)
+            if device_key is not None and os.environ.get(PROBE_ENV):
+                # the indicator is read before the class-maps, a change made
+                # in between is fetched again by the next run
+                indicator = self._probe(connection)
+                cached = self._cache.get(device_key)
+                if indicator is not None and cached and cached.get("indicator") == indicator:
+                    self._module.debug(
+                        "class-maps unchanged since the last run, read from the cache"
+                    )
+                    return self._update_facts(ansible_facts, cached["class_maps"])
             data = self.get_class_map_data(connection)
 
-        # parse native config using the Class_maps template
-        class_maps_parser = Class_mapsTemplate(lines=data.splitlines(), module=self._module)
-        objs = list(class_maps_parser.parse().values())
+        # parse native config using the Class_maps template, a block at a time
+        class_maps_parser = Class_mapsTemplate(module=self._module)
+        class_maps = None
+        if self._cache:
+            key = self._cache.key(data, PARSER_VERSION)
+            class_maps = self._cache.get(key)
+        if class_maps is None and self._cache:
+            # reuse the class-maps of the blocks unchanged since the last run
+            # on the same device
+            blocks_key = self._cache.key(self._cache_scope(connection), PARSER_VERSION + "-blocks")
+            class_maps = list(
+                class_maps_parser.parse_incremental(
+                    self._cache.get(blocks_key) or {}, iter_lines(data)
+                )
+            )
+            self.counters = class_maps_parser.counters
+            self._module.debug(
+                "class-map blocks: {cached} cached, {parsed} parsed".format(**self.counters)
+            )
+            self._cache.set(key, class_maps)
+            if self.names is None:
+                # the blocks of a few class-maps would evict the ones of the others
+                self._cache.set(blocks_key, class_maps_parser.fragments)
+        elif class_maps is None:
+            class_maps = class_maps_parser.parse_iter(iter_lines(data))
+        objs = self._validate(class_maps_parser, class_maps)
+
+        if device_key is not None and self.names is None:
+            # the class-maps of the device, for the probe of the next run
+            self._cache.set(device_key, {"indicator": indicator, "class_maps": objs})
+
+        return self._update_facts(ansible_facts, objs)
+
+    def _validate(self, class_maps_parser, class_maps):
+        """ The validated class-maps, a class-map parsed from several blocks merged """
+        objs = []
+        positions = {}
+        class_maps = iter(class_maps)
+        while True:
+            batch = list(islice(class_maps, self.BATCH_SIZE))
+            if not batch:
+                break
+            params = utils.remove_empties(
+                class_maps_parser.validate_config(
+                    self.argument_spec, {"config": batch}, redact=True
+                )
+            )
+            for obj in params.get("config", []):
+                # a class-map configured in several blocks is merged like parse() does
+                if obj.get("name") in positions:
+                    position = positions[obj.get("name")]
+                    objs[position] = utils.dict_merge(objs[position], obj)
+                else:
+                    positions[obj.get("name")] = len(objs)
+                    objs.append(obj)
+        return objs
+
+    def _update_facts(self, ansible_facts, objs):
+        facts = {}
+        if self.names is not None:
+            objs = [obj for obj in objs if obj.get("name") in self.names]
+        if objs:
+            facts["class_maps"] = objs
 
         ansible_facts["ansible_network_resources"].pop("class_maps", None)
-
-        for class_map in objs:
-            if class_map.get("matches"):
-                matches = class_map.get("matches")
-                for match in matches:
-                    if match.get("cos"):
-                        cos_values = match.get("cos")
-                        match["cos"] = list(filter(lambda v: v is not None, cos_values))
-
-                    if match.get("cos_inner"):
-                        cos_values = match.get("cos_inner")
-                        match["cos_inner"] = list(filter(lambda v: v is not None, cos_values))
-
-                    if match.get("dscp"):
-                        dscp_values = match.get("dscp").get("dscp_values")
-                        for i in range(len(dscp_values)):
-                            if Class_mapsTemplate.DSCP_VALUES.get(dscp_values[i], None) is not None:
-                                dscp_values[i] = Class_mapsTemplate.DSCP_VALUES.get(dscp_values[i])
-                            elif isinstance(dscp_values[i], int):
-                                dscp_values[i] = str(dscp_values[i])
-                        match["dscp"]["dscp_values"] = list(
-                            filter(lambda v: v is not None, dscp_values)
-                        )
-                        match["dscp"]["dscp_values"].sort()
-
-                    if match.get("ip_precedence"):
-                        ip_precedence_values = match.get("ip_precedence")
-                        match["ip_precedence"] = list(
-                            filter(lambda v: v is not None, ip_precedence_values)
-                        )
-
-                    if match.get("mpls_experimental_topmost"):
-                        mpls_values = match.get("mpls_experimental_topmost")
-                        match["mpls_experimental_topmost"] = list(
-                            filter(lambda v: v is not None, mpls_values)
-                        )
-
-        params = utils.remove_empties(
-            class_maps_parser.validate_config(self.argument_spec, {"config": objs}, redact=True)
-        )
-
-        if "config" in params:
-            facts["class_maps"] = params["config"]
-
         ansible_facts["ansible_network_resources"].update(facts)
 
         return ansible_facts
@@ -15,114 +15,154 @@ from __future__ import absolute_import, division, print_function
 __metaclass__ = type
 
 
+import os
+import threading
+
+from collections import OrderedDict
+from importlib import import_module
+from multiprocessing.pool import ThreadPool
+
+from ansible.module_utils._text import to_text
+from ansible.module_utils.common._collections_compat import Mapping
 from ansible_collections.ansible.netcommon.plugins.module_utils.network.common.facts.facts import (
     FactsBase,
 )
 
-from ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.acl_interfaces.acl_interfaces import (
-    Acl_interfacesFacts,
-)
-from ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.acls.acls import AclsFacts
-from ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.bgp_address_family.bgp_address_family import (
-    Bgp_address_familyFacts,
-)
-from ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.bgp_global.bgp_global import (
-    Bgp_globalFacts,
-)
-from ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.hostname.hostname import (
-    HostnameFacts,
-)
-from ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.interfaces.interfaces import (
-    InterfacesFacts,
-)
-from ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.l2_interfaces.l2_interfaces import (
-    L2_interfacesFacts,
-)
-from ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.l3_interfaces.l3_interfaces import (
-    L3_InterfacesFacts,
-)
-from ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.lacp.lacp import LacpFacts
-from ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.lacp_interfaces.lacp_interfaces import (
-    Lacp_InterfacesFacts,
-)
-from ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.lag_interfaces.lag_interfaces import (
-    Lag_interfacesFacts,
-)
 from ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.legacy.base import (
     Config,
     Default,
     Hardware,
     Interfaces,
 )
-from ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.lldp_global.lldp_global import (
-    Lldp_globalFacts,
-)
-from ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.lldp_interfaces.lldp_interfaces import (
-    Lldp_InterfacesFacts,
-)
-from ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.logging_global.logging_global import (
-    Logging_globalFacts,
-)
-from ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.ntp_global.ntp_global import (
-    Ntp_globalFacts,
-)
-from ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.ospf_interfaces.ospf_interfaces import (
-    Ospf_InterfacesFacts,
-)
-from ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.ospfv2.ospfv2 import (
-    Ospfv2Facts,
-)
-from ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.ospfv3.ospfv3 import (
-    Ospfv3Facts,
-)
-from ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.prefix_lists.prefix_lists import (
-    Prefix_listsFacts,
-)
-from ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.route_maps.route_maps import (
-    Route_mapsFacts,
-)
-from ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.snmp_server.snmp_server import (
-    Snmp_serverFacts,
-)
-from ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.static_routes.static_routes import (
-    Static_routesFacts,
-)
-from ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.vlans.vlans import (
-    VlansFacts,
-)
-from ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.class_maps.class_maps import (
-    Class_mapsFacts,
+
+
+FACTS_PACKAGE = "ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts"
+
+# the resource subsets and the names of their facts classes, the facts class
+# of a subset is in the module FACTS_PACKAGE.<name>.<name>
+RESOURCE_FACTS_CLASSES = (
+    ("interfaces", "InterfacesFacts"),
+    ("l2_interfaces", "L2_interfacesFacts"),
+    ("vlans", "VlansFacts"),
+    ("lag_interfaces", "Lag_interfacesFacts"),
+    ("lacp", "LacpFacts"),
+    ("lacp_interfaces", "Lacp_InterfacesFacts"),
+    ("lldp_global", "Lldp_globalFacts"),
+    ("lldp_interfaces", "Lldp_InterfacesFacts"),
+    ("l3_interfaces", "L3_InterfacesFacts"),
+    ("acl_interfaces", "Acl_interfacesFacts"),
+    ("static_routes", "Static_routesFacts"),
+    ("acls", "AclsFacts"),
+    ("ospfv2", "Ospfv2Facts"),
+    ("ospfv3", "Ospfv3Facts"),
+    ("ospf_interfaces", "Ospf_InterfacesFacts"),
+    ("bgp_global", "Bgp_globalFacts"),
+    ("bgp_address_family", "Bgp_address_familyFacts"),
+    ("logging_global", "Logging_globalFacts"),
+    ("route_maps", "Route_mapsFacts"),
+    ("prefix_lists", "Prefix_listsFacts"),
+    ("ntp_global", "Ntp_globalFacts"),
+    ("snmp_server", "Snmp_serverFacts"),
+    ("hostname", "HostnameFacts"),
+    ("class_maps", "Class_mapsFacts"),
 )
 
+if False:  # pylint: disable=using-constant-test
+    # never run, the module_utils finder of AnsiballZ only packages the facts
+    # modules imported by name, test_finder_imports keeps these in line with
+    # RESOURCE_FACTS_CLASSES
+    import ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.interfaces.interfaces  # noqa: F401
+    import ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.l2_interfaces.l2_interfaces  # noqa: F401
+    import ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.vlans.vlans  # noqa: F401
+    import ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.lag_interfaces.lag_interfaces  # noqa: F401
+    import ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.lacp.lacp  # noqa: F401
+    import ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.lacp_interfaces.lacp_interfaces  # noqa: F401
+    import ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.lldp_global.lldp_global  # noqa: F401
+    import ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.lldp_interfaces.lldp_interfaces  # noqa: F401
+    import ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.l3_interfaces.l3_interfaces  # noqa: F401
+    import ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.acl_interfaces.acl_interfaces  # noqa: F401
+    import ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.static_routes.static_routes  # noqa: F401
+    import ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.acls.acls  # noqa: F401
+    import ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.ospfv2.ospfv2  # noqa: F401
+    import ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.ospfv3.ospfv3  # noqa: F401
+    import ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.ospf_interfaces.ospf_interfaces  # noqa: F401
+    import ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.bgp_global.bgp_global  # noqa: F401
+    import ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.bgp_address_family.bgp_address_family  # noqa: F401
+    import ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.logging_global.logging_global  # noqa: F401
+    import ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.route_maps.route_maps  # noqa: F401
+    import ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.prefix_lists.prefix_lists  # noqa: F401
+    import ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.ntp_global.ntp_global  # noqa: F401
+    import ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.snmp_server.snmp_server  # noqa: F401
+    import ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.hostname.hostname  # noqa: F401
+    import ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.class_maps.class_maps  # noqa: F401
+
+
+def _import_resource_facts(name, class_name):
+    """Import the facts class of a resource subset
+
+    The facts module is imported here so that a module only runs the ones of
+    the subsets it gathers.
+
+    :param name: the name of the resource subset
+    :param class_name: the name of the facts class in its module
+    :rtype: class
+    :returns: the facts class of the subset
+    """
+    module = import_module("{0}.{1}.{1}".format(FACTS_PACKAGE, name))
+    return getattr(module, class_name)
+
+
+class ResourceFactsSubsets(Mapping):
+    """The resource subsets and their facts classes, imported on first use"""
+
+    def __init__(self, class_names):
+        self._class_names = OrderedDict(class_names)
+        self._classes = {}
+
+    def __getitem__(self, name):
+        if name not in self._classes:
+            self._classes[name] = _import_resource_facts(name, self._class_names[name])
+        return self._classes[name]
+
+    def __iter__(self):
+        return iter(self._class_names)
+
+    def __len__(self):
+        return len(self._class_names)
+
+
+# held by the threads gathering the resource subsets, except while they wait
+# for the device, netcommon's validate_config() swaps the module arguments of
+# the process, so only the fetches can run at the same time
+_gather_lock = threading.Lock()
+
+
+class LockedFetchConnection(object):
+    """A connection whose `get()` releases `_gather_lock` while it waits for
+    the device, the other attributes are the ones of the connection
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def get(self, *args, **kwargs):
+        _gather_lock.release()
+        try:
+            return self.connection.get(*args, **kwargs)
+        finally:
+            _gather_lock.acquire()
+
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
+
+
+# environment variable of the number of threads gathering the resource
+# subsets, unset or below 2 gathers them one after another
+GATHER_THREADS_ENV = "ANSIBLE_IOS_FACTS_GATHER_THREADS"
 
 FACT_LEGACY_SUBSETS = dict(default=Default, hardware=Hardware, interfaces=Interfaces, config=Config)
 
-FACT_RESOURCE_SUBSETS = dict(
-    interfaces=InterfacesFacts,
-    l2_interfaces=L2_interfacesFacts,
-    vlans=VlansFacts,
-    lag_interfaces=Lag_interfacesFacts,
-    lacp=LacpFacts,
-    lacp_interfaces=Lacp_InterfacesFacts,
-    lldp_global=Lldp_globalFacts,
-    lldp_interfaces=Lldp_InterfacesFacts,
-    l3_interfaces=L3_InterfacesFacts,
-    acl_interfaces=Acl_interfacesFacts,
-    static_routes=Static_routesFacts,
-    acls=AclsFacts,
-    ospfv2=Ospfv2Facts,
-    ospfv3=Ospfv3Facts,
-    ospf_interfaces=Ospf_InterfacesFacts,
-    bgp_global=Bgp_globalFacts,
-    bgp_address_family=Bgp_address_familyFacts,
-    logging_global=Logging_globalFacts,
-    route_maps=Route_mapsFacts,
-    prefix_lists=Prefix_listsFacts,
-    ntp_global=Ntp_globalFacts,
-    snmp_server=Snmp_serverFacts,
-    hostname=HostnameFacts,
-    class_maps=Class_mapsFacts,
-)
+FACT_RESOURCE_SUBSETS = ResourceFactsSubsets(RESOURCE_FACTS_CLASSES)
 
 
 class Facts(FactsBase):
@@ -133,6 +173,7 @@ class Facts(FactsBase):
 
     def __init__(self, module):
         super(Facts, self).__init__(module)
+        self._threads = int(os.environ.get(GATHER_THREADS_ENV) or 0)
 
     def get_facts(self, legacy_facts_type=None, resource_facts_type=None, data=None):
         """Collect the facts for ios
@@ -149,3 +190,80 @@ class Facts(FactsBase):
             self.get_network_legacy_facts(FACT_LEGACY_SUBSETS, legacy_facts_type)
 
         return self.ansible_facts, self._warnings
+
+    def get_network_resources_facts(
+        self, facts_resource_obj_map, resource_facts_type=None, data=None
+    ):
+        """Gather the resource subsets, in a pool of threads with GATHER_THREADS_ENV
+
+        The threads overlap the device fetches of the subsets, they parse and
+        validate the facts one at a time under `_gather_lock`. Every subset is
+        gathered into its own facts, merged in the order of the subsets, so the
+        facts are the same as the serial ones. After an error no other subset
+        starts, the error of the first failed subset is raised here.
+
+        :param facts_resource_obj_map: the facts classes of the subsets
+        :param resource_facts_type: List of resource fact types
+        :param data: previously collected conf
+        """
+        if self._threads < 2:
+            return super(Facts, self).get_network_resources_facts(
+                facts_resource_obj_map, resource_facts_type, data
+            )
+        if not resource_facts_type:
+            resource_facts_type = self._gather_network_resources
+
+        subsets = list(
+            self.gen_runable(
+                resource_facts_type,
+                frozenset(facts_resource_obj_map.keys()),
+                resource_facts=True,
+            )
+        )
+        if not subsets:
+            return
+        self.ansible_facts["ansible_net_gather_network_resources"] = subsets
+        instances = []
+        for key in subsets:
+            fact_cls_obj = facts_resource_obj_map.get(key)
+            if fact_cls_obj:
+                instances.append((key, fact_cls_obj(self._module)))
+            else:
+                self._warnings.append(
+                    "network resource fact gathering for '%s' is not supported" % key
+                )
+
+        connection = LockedFetchConnection(self._connection)
+        errors = []
+
+        def gather(instance):
+            facts = {"ansible_network_resources": {}}
+            with _gather_lock:
+                if errors:
+                    return None
+                try:
+                    instance.populate_facts(connection, facts, data)
+                except BaseException as exc:
+                    errors.append(exc)
+                    return exc
+            return facts
+
+        pool = ThreadPool(min(self._threads, len(instances)) or 1)
+        try:
+            gathered = pool.map(gather, [instance for _key, instance in instances])
+        finally:
+            pool.terminate()
+            pool.join()
+
+        for error in gathered:
+            if isinstance(error, Exception):
+                self._module.fail_json(msg=to_text(error))
+                return
+            if isinstance(error, BaseException):
+                raise error
+
+        resources = self.ansible_facts["ansible_network_resources"]
+        for (key, _instance), facts in zip(instances, gathered):
+            resources.pop(key, None)
+            resources.update(facts.pop("ansible_network_resources"))
+            self.ansible_facts.update(facts)
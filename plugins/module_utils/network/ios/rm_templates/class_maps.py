@@ -14,15 +14,1179 @@ facilitates both facts gathering and native command generation for
 the given network resource.
 """
 
+import hashlib
+import json
+import multiprocessing
+import os
 import re
+import string
+import threading
+from ast import literal_eval
+from copy import deepcopy
+from itertools import chain, islice
+
+from ansible.module_utils._text import to_bytes
+from ansible.module_utils.common._collections_compat import Mapping
+from ansible.module_utils.six import string_types
 from ansible_collections.ansible.netcommon.plugins.module_utils.network.common.rm_base.network_template import (
     NetworkTemplate,
 )
+from ansible_collections.ansible.netcommon.plugins.module_utils.network.common.utils import (
+    sort_list,
+)
+
+# version of the parse results, change it whenever the parsers change them,
+# it is a part of the keys of the cached results
+PARSER_VERSION = "1"
+
+# environment variable selecting the engine of `Class_mapsTemplate.parse()`
+PARSE_ENGINE_ENV = "ANSIBLE_IOS_CLASS_MAPS_PARSE_ENGINE"
+PARSE_ENGINES = ("regex", "tokenizer")
+
+# environment variables of the parallel parse, it is off unless the threshold
+# is set, configurations with fewer class-map blocks than the threshold are
+# parsed serially, 0 disables it
+PARALLEL_THRESHOLD_ENV = "ANSIBLE_IOS_CLASS_MAPS_PARALLEL_THRESHOLD"
+PARALLEL_PROCESSES_ENV = "ANSIBLE_IOS_CLASS_MAPS_PARALLEL_PROCESSES"
+
+# regex flags and their inline form
+INLINE_FLAGS = (
+    (re.IGNORECASE, "i"),
+    (re.MULTILINE, "m"),
+    (re.DOTALL, "s"),
+    (re.VERBOSE, "x"),
+)
+
+
+class LazyPattern(str):
+    """A regex compiled when it is first used
+
+    Only parsing matches the parsers' `getval`, so the modules rendering
+    commands don't compile them. The value of the string is the pattern with
+    its flags inline, like `(?x)` for re.VERBOSE, so `re.match(getval, line)`
+    of `NetworkTemplate.parse()` works too.
+    """
+
+    def __new__(cls, pattern, flags=0):
+        inline = ""
+        for flag, letter in INLINE_FLAGS:
+            if flags & flag:
+                inline += letter
+        if flags & ~sum(flag for flag, _letter in INLINE_FLAGS):
+            raise ValueError("Unsupported regex flags {0}".format(flags))
+        self = str.__new__(cls, "(?{0}){1}".format(inline, pattern) if inline else pattern)
+        self.pattern = pattern
+        self.flags = flags
+        self._regex = None
+        return self
+
+    def __getnewargs__(self):
+        return self.pattern, self.flags
+
+    @property
+    def regex(self):
+        """The compiled pattern"""
+        if self._regex is None:
+            self._regex = re.compile(self.pattern, self.flags)
+            # the compiled pattern's methods shadow the ones below from now on
+            self.match = self._regex.match
+            self.search = self._regex.search
+        return self._regex
+
+    @property
+    def groupindex(self):
+        return self.regex.groupindex
+
+    def match(self, string, *args):
+        return self.regex.match(string, *args)
+
+    def search(self, string, *args):
+        return self.regex.search(string, *args)
+
+
+# leading literals of a parser's `getval`, e.g. `match` and `cos` in
+# `^\s*match(\s(?P<negate>not))?\scos...`
+KEYWORDS_RE = LazyPattern(
+    r"""^\^\\s\*(?P<head>[\w-]+)
+        (\(\\s\(\?P<negate>not\)\)\?)?
+        (\\s\(?(?P<keyword>[\w-]+))?""",
+    re.VERBOSE,
+)
+
+
+# The value sets of the matches and the number of their values. Internally
+# a set is the bitmask of its values, the bit `n` is set when `n` is in the
+# set, the documented form is the sorted list of the values.
+VALUE_SETS = {
+    "cos": 8,
+    "cos_inner": 8,
+    "ip_precedence": 8,
+    "mpls_experimental_topmost": 8,
+}
+DSCP_SIZE = 64
+
+
+def values_mask(values, size):
+    """The bitmask of a set of integer values
+
+    :param values: the list of the values
+    :param size: the number of the possible values, `0` to `size - 1`
+    :rtype: int
+    :returns: the bitmask, or None if a value is not one of the possible ones
+    """
+    mask = 0
+    for value in values:
+        if isinstance(value, bool) or not isinstance(value, int) or not 0 <= value < size:
+            return None
+        mask |= 1 << value
+    return mask
+
+
+def mask_values(mask):
+    """The sorted list of the values of a bitmask"""
+    values = []
+    value = 0
+    while mask:
+        if mask & 1:
+            values.append(value)
+        mask >>= 1
+        value += 1
+    return values
+
+
+def dscp_mask(values):
+    """The bitmask of a set of DSCP values, the names are replaced by their values
+
+    :param values: the list of the DSCP values, the numbers are strings
+    :rtype: int
+    :returns: the bitmask, or None if a value is not a DSCP value
+    """
+    mask = 0
+    for value in values:
+        value = Class_mapsTemplate.DSCP_VALUES.get(value, value)
+        if (
+            not isinstance(value, string_types)
+            or not value
+            or not DIGITS.issuperset(value)
+            or (value[0] == "0" and value != "0")
+            or int(value) >= DSCP_SIZE
+        ):
+            return None
+        mask |= 1 << int(value)
+    return mask
+
+
+def mask_dscp_values(mask):
+    """The documented form of a set of DSCP values, the sorted list of the strings"""
+    return sorted(str(value) for value in mask_values(mask))
+
+
+def _frozen(value):
+    if isinstance(value, dict):
+        return tuple(sorted((k, _frozen(v)) for k, v in value.items()))
+    if isinstance(value, list):
+        return tuple(_frozen(item) for item in value)
+    return value
+
+
+def match_key(match):
+    """A hashable canonical form of a match, to compare and index matches
+
+    The value sets are bitmasks, so comparing them is an integer comparison.
+    Value sets that can't be bitmasks, and the other options, are compared
+    as they are.
+
+    :param match: a match of a class-map
+    :rtype: tuple
+    :returns: the key of the match
+    """
+    key = []
+    for option, value in match.items():
+        if option in VALUE_SETS and isinstance(value, list):
+            mask = values_mask(value, VALUE_SETS[option])
+            if mask is not None:
+                value = mask
+        elif option == "dscp" and isinstance(value, dict):
+            mask = None
+            if isinstance(value.get("dscp_values"), list):
+                mask = dscp_mask(value["dscp_values"])
+            if mask is not None:
+                value = dict(value, dscp_values=mask)
+        key.append((option, _frozen(value)))
+    return tuple(sorted(key))
+
+
+def class_map_key(class_map):
+    """A hashable canonical form of a class-map, to compare class-maps
+
+    It covers the options of the class-map, like its name, match type and
+    description, and the keys of its matches. The order of the matches, and
+    the ones repeated, don't change it, they don't change the commands.
+
+    :param class_map: a class-map
+    :rtype: tuple
+    :returns: the key of the class-map
+    """
+    options = dict((k, v) for k, v in class_map.items() if k != "matches")
+    matches = frozenset(match_key(match) for match in class_map.get("matches") or [])
+    return _frozen(options), matches
+
+
+def class_map_fingerprint(class_map):
+    """A digest of the key of a class-map, see `class_map_key`
+
+    :param class_map: a class-map
+    :rtype: str
+    :returns: the hex digest of the class-map
+    """
+    options, matches = class_map_key(class_map)
+    matches = sorted(json.dumps(key) for key in matches)
+    content = json.dumps([options, matches])
+    return hashlib.sha256(to_bytes(content, errors="surrogate_or_strict")).hexdigest()
+
+
+# Python builders of the parsers' `result` fragments. The Jinja `result`
+# templates are kept as the reference implementation, see `compiled`.
+DIGITS = frozenset(string.digits)
+NAME_START = frozenset(string.ascii_letters)
+NAME_CHARS = frozenset(string.ascii_letters + string.digits + "-_.:/")
+
+
+def _literal(value):
+    """Evaluate a captured value the same way the rendered Jinja templates are"""
+    if not value:
+        return None
+    # shortcuts for plain numbers and names, which literal_eval would
+    # return as an int and fail to evaluate respectively
+    if value[0] in DIGITS:
+        if DIGITS.issuperset(value) and (value[0] != "0" or not value.strip("0")):
+            return int(value)
+    elif (
+        value[0] in NAME_START
+        and NAME_CHARS.issuperset(value)
+        and not value.startswith(("True", "False", "None"))
+    ):
+        return value
+    try:
+        return literal_eval(value)
+    except Exception:
+        return str(value)
+
+
+def _compact(data):
+    return dict((k, v) for k, v in data.items() if v is not None)
+
+
+def _digits(value):
+    """Sorted unique list of the single digit values of `match cos 1 4 6`-like lines"""
+    mask = 0
+    for digit in "".join(value.split()):
+        mask |= 1 << int(digit)
+    return mask_values(mask)
+
+
+def _dscp_values(value):
+    """Sorted unique list of the DSCP values, with the names replaced by their values"""
+    values = value.split()
+    mask = dscp_mask(values)
+    if mask is None:
+        return sorted(set(Class_mapsTemplate.DSCP_VALUES.get(v, v) for v in values))
+    return mask_dscp_values(mask)
+
+
+def _class_map(vals, data):
+    return {_literal(vals.get("class_map_name")): data}
+
+
+def _match(vals, data):
+    if vals.get("negate"):
+        data["negate"] = True
+    return _class_map(vals, {"matches": [data]})
+
+
+def _result_class_map(vals):
+    return _class_map(
+        vals,
+        _compact(
+            {
+                "name": _literal(vals.get("class_map_name")),
+                "match_type": _literal(vals.get("match_type")),
+            }
+        ),
+    )
+
+
+def _result_description(vals):
+    return _class_map(vals, _compact({"description": _literal(vals.get("description"))}))
+
+
+def _result_match_access_group(vals):
+    return _match(
+        vals,
+        {
+            "access_group": _compact(
+                {"name": _literal(vals.get("name")), "number": _literal(vals.get("number"))}
+            ),
+        },
+    )
+
+
+def _result_match_any(vals):
+    return _class_map(vals, {"matches": [{"any": True}]})
+
+
+def _result_match_application(vals):
+    return _match(
+        vals,
+        {
+            "application": _compact(
+                {
+                    "name": _literal(vals.get("name")),
+                    "source": _literal(vals.get("source")),
+                    "vendor": _literal(vals.get("vendor")),
+                    "version": _literal(vals.get("version")),
+                }
+            ),
+        },
+    )
+
+
+def _result_match_application_attribute(vals):
+    return _match(
+        vals,
+        {
+            "application_attribute": _compact(
+                {
+                    _literal(vals["attribute"].replace("-", "_")): _literal(vals.get("value")),
+                }
+            ),
+        },
+    )
+
+
+def _result_match_application_group(vals):
+    return _match(vals, _compact({"application_group": _literal(vals.get("application_group"))}))
+
+
+def _result_match_class_map(vals):
+    return _match(vals, _compact({"class_map": _literal(vals.get("class_map"))}))
+
+
+def _result_match_cac_status(vals):
+    return _match(vals, _compact({"cac_status": _literal(vals.get("cac_status"))}))
+
+
+def _result_match_cos(vals):
+    return _match(vals, {"cos": _digits(vals["cos"])})
+
+
+def _result_match_cos_inner(vals):
+    return _match(vals, {"cos_inner": _digits(vals["cos_inner"])})
+
+
+def _result_match_destination_mac(vals):
+    return _match(vals, _compact({"destination_mac_address": _literal(vals["dest_mac"].upper())}))
+
+
+def _result_match_discard_class(vals):
+    return _match(vals, _compact({"discard_class": _literal(vals.get("discard_class"))}))
+
+
+def _result_match_object_group_security(vals):
+    return _match(
+        vals,
+        {
+            "object_group_security": _compact(
+                {"endpoint": _literal(vals.get("endpoint")), "name": _literal(vals.get("name"))}
+            ),
+        },
+    )
+
+
+def _result_match_input_interface(vals):
+    return _match(
+        vals,
+        {
+            "input_interface": _compact(
+                {
+                    "interface_type": _literal(vals["interface_type"].lower()),
+                    "interface_number": _literal(vals.get("interface_number")),
+                }
+            ),
+        },
+    )
+
+
+def _result_match_dscp(vals):
+    return _match(vals, {"dscp": {"dscp_values": _dscp_values(vals["dscp"])}})
+
+
+def _result_match_ip_dscp(vals):
+    return _match(
+        vals, {"dscp": {"dscp_values": _dscp_values(vals["dscp"]), "ip_versions": "ipv4"}}
+    )
+
+
+def _result_match_ip_precedence(vals):
+    return _match(vals, {"ip_precedence": _digits(vals["precedence"])})
+
+
+def _result_match_ip_rtp(vals):
+    return _match(
+        vals,
+        {
+            "ip_rtp": _compact(
+                {
+                    "starting_port_number": _literal(vals.get("starting_port_number")),
+                    "port_range": _literal(vals.get("port_range")),
+                }
+            ),
+        },
+    )
+
+
+def _result_match_metadata(vals):
+    return _match(
+        vals,
+        {
+            "metadata": _compact(
+                {
+                    _literal(vals["metadata_type"].replace("-", "_").replace(" ", "_")): _literal(
+                        vals.get("metadata_value")
+                    ),
+                }
+            ),
+        },
+    )
+
+
+def _result_match_mpls_experimental(vals):
+    return _match(vals, {"mpls_experimental_topmost": _digits(vals["mpls"])})
+
+
+def _result_match_packet_length(vals):
+    return _match(
+        vals,
+        {
+            "packet_length": _compact(
+                {"min": _literal(vals.get("min")), "max": _literal(vals.get("max"))}
+            ),
+        },
+    )
+
+
+def _result_match_protocol_attribute(vals):
+    return _match(
+        vals,
+        {
+            "protocol_attribute": _compact(
+                {
+                    "attribute_name": _literal(vals.get("attribute_name")),
+                    "attribute_value": _literal(vals.get("attribute_value")),
+                }
+            ),
+        },
+    )
+
+
+def _result_match_protocol(vals):
+    return _match(
+        vals,
+        {
+            "protocol": _compact(
+                {
+                    "protocol_name": _literal(vals.get("protocol_name")),
+                    "subprotocol_parameter": _compact(
+                        {
+                            "subprotocol_parameter_name": _literal(
+                                vals.get("subprotocol_parameter_name")
+                            ),
+                            "subprotocol_parameter_value": _literal(
+                                vals.get("subprotocol_parameter_value")
+                            ),
+                        }
+                    ),
+                }
+            ),
+        },
+    )
+
+
+def _result_match_qos_group(vals):
+    return _match(vals, _compact({"qos_group": _literal(vals.get("qos_group_num"))}))
+
+
+def _result_match_security_group(vals):
+    return _match(
+        vals,
+        {
+            "security_group": _compact(
+                {
+                    _literal(vals["direction"].replace(" ", "_")): _literal(vals.get("num")),
+                }
+            ),
+        },
+    )
+
+
+def _result_match_source_mac(vals):
+    return _match(vals, _compact({"source_mac_address": _literal(vals["source_mac"].upper())}))
+
+
+def _result_match_start(vals):
+    return _class_map(
+        vals,
+        {
+            "matches": [
+                {
+                    "start": _compact(
+                        {
+                            "layer": _literal(vals.get("layer")),
+                            "offset": _literal(vals.get("offset")),
+                            "size": _literal(vals.get("size")),
+                            _literal(vals["eq_type"]): _compact(
+                                {
+                                    "value": _literal(vals.get("value")),
+                                    "mask": _literal(vals.get("mask")),
+                                }
+                            ),
+                        }
+                    ),
+                }
+            ]
+        },
+    )
+
+
+def _result_match_vlan(vals):
+    return _match(vals, _compact({"vlan": _literal(vals.get("id"))}))
+
+
+def _result_match_vlan_inner(vals):
+    return _match(vals, _compact({"vlan_inner": _literal(vals.get("id"))}))
+
+
+def _result_match_traffic_category(vals):
+    return _match(vals, _compact({"traffic_category": _literal(vals.get("traffic_category"))}))
+
+
+# Python formatters of the parsers' `setval` commands. A missing key raises a
+# KeyError, which renders no command, like an undefined variable in Jinja.
+def _negate(data):
+    return " not" if data.get("negate") else ""
+
+
+def _values_cmd(values):
+    return "".join(" {0}".format(value) for value in values)
+
+
+def _optional_cmd(data, options):
+    return "".join(prefix + data[key] for key, prefix in options if key in data)
+
+
+def _tmplt_class_map(data):
+    return "class-map {0} {1}".format(data.get("match_type", ""), data["name"])
+
+
+def _tmplt_description(data):
+    return "description {0}".format(data["description"])
+
+
+def _tmplt_match_access_group(data):
+    access_group = data["access_group"]
+    if "number" in access_group:
+        value = access_group["number"]
+    else:
+        value = "name " + access_group["name"]
+    return "match{0} access-group {1}".format(_negate(data), value)
+
+
+def _tmplt_match_any(data):
+    return "match any" if data["any"] else None
+
+
+def _tmplt_match_application(data):
+    application = data["application"]
+    return "match{0} application {1} {2}".format(
+        _negate(data),
+        application["name"],
+        _optional_cmd(
+            application,
+            [("source", "source "), ("vendor", "vendor "), ("version", "version ")],
+        ),
+    )
+
+
+def _tmplt_match_application_attribute(data):
+    return "match{0} application attribute {1}".format(
+        _negate(data),
+        _optional_cmd(
+            data["application_attribute"],
+            [
+                ("category", "category "),
+                ("device_class", "device-class "),
+                ("media_type", "media-type "),
+                ("sub_category", "sub-category "),
+                ("tcl", "tcl "),
+            ],
+        ),
+    )
+
+
+def _tmplt_match_application_group(data):
+    return "match{0} application application-group {1}".format(
+        _negate(data), data["application_group"]
+    )
+
+
+def _tmplt_match_class_map(data):
+    return "match{0} class-map {1}".format(_negate(data), data["class_map"])
+
+
+def _tmplt_match_cac_status(data):
+    return "match{0} cac status {1}".format(_negate(data), data["cac_status"])
+
+
+def _tmplt_match_cos(data):
+    return "match{0} cos{1}".format(_negate(data), _values_cmd(data["cos"]))
+
+
+def _tmplt_match_cos_inner(data):
+    return "match{0} cos inner{1}".format(_negate(data), _values_cmd(data["cos_inner"]))
+
+
+def _tmplt_match_destination_mac(data):
+    return "match{0} destination-address mac {1}".format(
+        _negate(data), data["destination_mac_address"]
+    )
+
+
+def _tmplt_match_discard_class(data):
+    return "match{0} discard-class {1}".format(_negate(data), data["discard_class"])
+
+
+def _tmplt_match_object_group_security(data):
+    object_group_security = data["object_group_security"]
+    return "match{0} group-object security {1} {2}".format(
+        _negate(data), object_group_security["endpoint"], object_group_security["name"]
+    )
+
+
+def _tmplt_match_input_interface(data):
+    input_interface = data["input_interface"]
+    return "match{0} input-interface {1} {2}".format(
+        _negate(data), input_interface["interface_type"], input_interface["interface_number"]
+    )
+
+
+def _tmplt_match_ip_dscp(data):
+    dscp = data["dscp"]
+    return "match{0}{1} dscp{2}".format(
+        _negate(data),
+        " ip" if dscp["ip_versions"] == "ipv4" else "",
+        _values_cmd(dscp["dscp_values"]),
+    )
+
+
+def _tmplt_match_ip_precedence(data):
+    return "match{0} ip precedence{1}".format(_negate(data), _values_cmd(data["ip_precedence"]))
+
+
+def _tmplt_match_ip_rtp(data):
+    ip_rtp = data["ip_rtp"]
+    return "match{0} ip rtp {1} {2}".format(
+        _negate(data), ip_rtp["starting_port_number"], ip_rtp["port_range"]
+    )
+
+
+def _tmplt_match_metadata(data):
+    return "match{0} metadata {1}".format(
+        _negate(data),
+        _optional_cmd(
+            data["metadata"],
+            [
+                ("cac_status", "cac status "),
+                ("called_uri", "called-uri "),
+                ("calling_uri", "calling-uri "),
+                ("device_model", "device-model "),
+                ("global_session_id", "global-session-id "),
+                ("multi_party_session_id", "multi-party-session-id "),
+            ],
+        ),
+    )
+
+
+def _tmplt_match_mpls_experimental(data):
+    return "match{0} mpls experimental topmost{1}".format(
+        _negate(data), _values_cmd(data["mpls_experimental_topmost"])
+    )
+
+
+def _tmplt_match_packet_length(data):
+    packet_length = data["packet_length"]
+    return "match{0} packet length{1}{2}".format(
+        _negate(data),
+        " min {0}".format(packet_length["min"]) if "min" in packet_length else "",
+        " max {0}".format(packet_length["max"]) if "max" in packet_length else "",
+    )
+
+
+def _tmplt_match_protocol_attribute(data):
+    protocol_attribute = data["protocol_attribute"]
+    return "match{0} protocol attribute {1} {2}".format(
+        _negate(data),
+        protocol_attribute["attribute_name"],
+        protocol_attribute["attribute_value"],
+    )
+
+
+def _tmplt_match_protocol(data):
+    protocol = data["protocol"]
+    return "match{0} protocol {1}{2}".format(
+        _negate(data),
+        protocol["protocol_name"],
+        _optional_cmd(
+            protocol.get("subprotocol_parameter", {}),
+            [("subprotocol_parameter_name", " "), ("subprotocol_parameter_value", " ")],
+        ),
+    )
+
+
+def _tmplt_match_qos_group(data):
+    return "match{0} qos-group {1}".format(_negate(data), data["qos_group"])
+
+
+def _tmplt_match_security_group(data):
+    security_group = data["security_group"]
+    return "match{0} security-group{1}{2}".format(
+        _negate(data),
+        (
+            " destination tag {0}".format(security_group["destination_tag"])
+            if "destination_tag" in security_group
+            else ""
+        ),
+        (
+            " source tag {0}".format(security_group["source_tag"])
+            if "source_tag" in security_group
+            else ""
+        ),
+    )
+
+
+def _tmplt_match_source_mac(data):
+    return "match{0} source-address mac {1}".format(_negate(data), data["source_mac_address"])
+
+
+def _tmplt_match_vlan(data):
+    return "match{0} vlan {1}".format(_negate(data), data["vlan"])
+
+
+def _tmplt_match_vlan_inner(data):
+    return "match{0} vlan inner {1}".format(_negate(data), data["vlan_inner"])
+
+
+def _tmplt_match_traffic_category(data):
+    return "match{0} traffic-category {1}".format(_negate(data), data["traffic_category"])
+
+
+# Grammar of the `match` lines for the tokenizer engine. Each function gets the
+# tokens following the criterion keyword and returns the captures the parser's
+# `getval` would have, or None if it can't tell, so the line goes to the regexes.
+
+
+def _number(token, min_len=1, max_len=None):
+    return min_len <= len(token) <= (max_len or len(token)) and DIGITS.issuperset(token)
+
+
+def _numbers(tokens):
+    return bool(tokens) and all(_number(token) for token in tokens)
+
+
+def _quoted(token):
+    return len(token) > 2 and token[0] == '"' and token[-1] == '"'
+
+
+def _grammar_match_access_group(rest):
+    if len(rest) == 1:
+        return {"number": rest[0]}
+    if len(rest) == 2 and rest[0] == "name":
+        return {"name": rest[1]}
+
+
+def _grammar_match_any(rest):
+    if not rest:
+        return {}
+
+
+def _grammar_match_application(rest):
+    if not rest:
+        return None
+    capdict = {"name": rest[0]}
+    rest = rest[1:]
+    if (
+        len(rest) > 1
+        and rest[0] == "source"
+        and rest[1]
+        in (
+            "cli",
+            "cube",
+            "msp",
+            "nbar",
+            "rfmd",
+            "rsvp",
+            "cac",
+        )
+    ):
+        capdict["source"] = rest[1]
+        rest = rest[2:]
+    if len(rest) > 1 and rest[0] == "vendor":
+        # the vendor group of the regex captures nothing
+        capdict["vendor"] = ""
+        rest = rest[2:]
+    if len(rest) > 1 and rest[0] == "version":
+        capdict["version"] = rest[1]
+        rest = rest[2:]
+    if not rest:
+        return capdict
+
+
+def _grammar_match_application_attribute(rest):
+    if (
+        len(rest) == 3
+        and rest[0] == "attribute"
+        and rest[1] in ("category", "device-class", "media-type", "sub-category", "tcl")
+    ):
+        return {"attribute": rest[1], "value": rest[2]}
+
+
+def _grammar_match_application_group(rest):
+    if (
+        len(rest) == 2
+        and rest[0] == "application-group"
+        and rest[1] in ("telepresence-group", "vmware-group", "webex-group")
+    ):
+        return {"application_group": rest[1]}
+
+
+def _grammar_match_class_map(rest):
+    if len(rest) == 1:
+        return {"class_map": rest[0]}
+
+
+def _grammar_match_cac_status(rest):
+    if len(rest) == 2 and rest[0] == "status" and rest[1] in ("admitted", "un-admitted"):
+        return {"cac_status": rest[1]}
+
+
+def _grammar_match_cos(rest):
+    if _numbers(rest):
+        return {"cos": " ".join(rest)}
+
+
+def _grammar_match_cos_inner(rest):
+    if rest and rest[0] == "inner" and _numbers(rest[1:]):
+        return {"cos_inner": " ".join(rest[1:])}
+
+
+def _grammar_match_destination_mac(rest):
+    if len(rest) == 2 and rest[0] == "mac":
+        return {"dest_mac": rest[1]}
+
+
+def _grammar_match_discard_class(rest):
+    if len(rest) == 1 and _number(rest[0], 1, 1):
+        return {"discard_class": rest[0]}
+
+
+def _grammar_match_object_group_security(rest):
+    if len(rest) == 3 and rest[0] == "security" and rest[1] in ("destination", "source"):
+        return {"endpoint": rest[1], "name": rest[2]}
+
+
+def _grammar_match_input_interface(rest):
+    if len(rest) == 1:
+        interface_type = rest[0].rstrip("0123456789")
+        if interface_type and interface_type != rest[0] and not interface_type[-1].isdigit():
+            return {
+                "interface_type": interface_type,
+                "interface_number": rest[0][len(interface_type) :],
+            }
+
+
+def _grammar_match_dscp(rest):
+    if rest:
+        return {"dscp": " ".join(rest)}
+
+
+def _grammar_match_ip_dscp(rest):
+    if len(rest) > 1 and rest[0] == "dscp":
+        return {"dscp": " ".join(rest[1:])}
+
+
+def _grammar_match_ip_precedence(rest):
+    if rest and rest[0] == "precedence" and _numbers(rest[1:]):
+        return {"precedence": " ".join(rest[1:])}
+
+
+def _grammar_match_ip_rtp(rest):
+    if len(rest) == 3 and rest[0] == "rtp" and _number(rest[1], 4, 5) and _number(rest[2], 1, 5):
+        return {"starting_port_number": rest[1], "port_range": rest[2]}
+
+
+def _grammar_match_metadata(rest):
+    if len(rest) == 2 and rest[0] in (
+        "called-uri",
+        "calling-uri",
+        "device-model",
+        "global-session-id",
+        "multi-party-session-id",
+    ):
+        return {"metadata_type": rest[0], "metadata_value": rest[1]}
+    if len(rest) == 3 and rest[0] == "cac" and rest[1] == "status":
+        return {"metadata_type": "cac status", "metadata_value": rest[2]}
+
+
+def _grammar_match_mpls_experimental(rest):
+    if rest[:2] == ["experimental", "topmost"] and _numbers(rest[2:]):
+        return {"mpls": " ".join(rest[2:])}
+
+
+def _grammar_match_packet_length(rest):
+    if len(rest) in (3, 5) and rest[0] == "length":
+        capdict = {}
+        for key, value in zip(rest[1::2], rest[2::2]):
+            if key not in ("min", "max") or not _number(value, 1, 4):
+                return None
+            capdict[key] = value
+        return capdict
+
+
+def _grammar_match_protocol_attribute(rest):
+    if len(rest) == 3 and rest[0] == "attribute":
+        return {"attribute_name": rest[1], "attribute_value": rest[2]}
+
+
+def _grammar_match_protocol(rest):
+    if len(rest) == 1:
+        return {"protocol_name": rest[0]}
+    if len(rest) == 3 and '"' not in rest[1] and _quoted(rest[2]):
+        return {
+            "protocol_name": rest[0],
+            "subprotocol_parameter_name": rest[1],
+            "subprotocol_parameter_value": rest[2][1:-1],
+        }
+
+
+def _grammar_match_qos_group(rest):
+    if len(rest) == 1 and _number(rest[0], 1, 2):
+        return {"qos_group_num": rest[0]}
+
+
+def _grammar_match_security_group(rest):
+    if (
+        len(rest) == 3
+        and rest[0] in ("destination", "source")
+        and rest[1] == "tag"
+        and _number(rest[2], 1, 5)
+    ):
+        return {"direction": rest[0] + " tag", "num": rest[2]}
+
+
+def _grammar_match_source_mac(rest):
+    if len(rest) == 2 and rest[0] == "mac":
+        return {"source_mac": rest[1]}
+
+
+def _grammar_match_start(rest):
+    if (
+        len(rest) in (7, 9)
+        and rest[0] in ("l2-start", "l3-start")
+        and rest[1] == "offset"
+        and _number(rest[2], 1, 3)
+        and rest[3] == "size"
+        and _number(rest[4], 1, 2)
+        and rest[5] in ("eq", "neq")
+    ):
+        capdict = {
+            "layer": rest[0][:2],
+            "offset": rest[2],
+            "size": rest[4],
+            "eq_type": rest[5],
+            "value": rest[6],
+        }
+        if len(rest) == 9:
+            if rest[7] != "mask":
+                return None
+            capdict["mask"] = rest[8]
+        return capdict
+
+
+def _grammar_match_vlan(rest):
+    if len(rest) == 1 and _number(rest[0], 1, 4):
+        return {"id": rest[0]}
+
+
+def _grammar_match_vlan_inner(rest):
+    if len(rest) == 2 and rest[0] == "inner" and _number(rest[1], 1, 4):
+        return {"id": rest[1]}
+
+
+def _grammar_match_traffic_category(rest):
+    if len(rest) == 1 and rest[0] in ("allow", "optimize"):
+        return {"traffic_category": rest[0]}
+
+
+def iter_lines(chunks, size=65536):
+    """Split text into lines lazily
+
+    The lines are the same as the ones of `"".join(chunks).splitlines()`,
+    but only a chunk of the text is split at a time.
+
+    :param chunks: the text, or an iterable of its chunks
+    :param size: the size of the chunks a text is sliced to
+    :rtype: generator
+    :returns: the lines of the text
+    """
+    if isinstance(chunks, string_types):
+        text = chunks
+        chunks = (text[start : start + size] for start in range(0, len(text), size))
+    pending = ""
+    for chunk in chunks:
+        lines = (pending + chunk).splitlines(True)
+        pending = ""
+        # the last line may continue in the next chunk, and so may a `\r\n`
+        if lines and (lines[-1].endswith("\r") or lines[-1].splitlines() == [lines[-1]]):
+            pending = lines.pop()
+        for line in lines:
+            yield line.splitlines()[0]
+    if pending:
+        yield pending.splitlines()[0]
+
+
+def _merge(result, fragment):
+    """Merge a parsed fragment into the result in place
+
+    This gives the same result as `result = dict_merge(result, fragment)`
+    without copying the whole result for every line.
+    """
+    for key, value in fragment.items():
+        if key not in result or value is None:
+            result[key] = value
+            continue
+        current = result[key]
+        if isinstance(current, dict):
+            result[key] = _merge(current, value) if isinstance(value, Mapping) else value
+        elif isinstance(current, list):
+            try:
+                result[key] = list(set(chain(current, value)))
+            except TypeError:
+                current.extend([item for item in value if item not in current])
+        elif sort_list(current) != sort_list(value):
+            result[key] = value
+    return result
+
+
+def _cpu_count():
+    try:
+        return multiprocessing.cpu_count()
+    except NotImplementedError:
+        return 1
+
+
+def fork_context():
+    """The multiprocessing context forking the workers, or None
+
+    The workers must inherit the loaded parsers, the module may be running
+    from a zip file that a spawned interpreter can't import it from. A process
+    running several threads isn't forked, a lock held by another thread would
+    never be released in the child.
+    """
+    if threading.active_count() > 1:
+        return None
+    try:
+        if "fork" in multiprocessing.get_all_start_methods():
+            return multiprocessing.get_context("fork")
+    except AttributeError:
+        pass
+    return None
+
+
+def _parse_chunk(args):
+    """Parse a chunk of class-map blocks in a worker process"""
+    lines, compiled, engine = args
+    tmplt = Class_mapsTemplate(compiled=compiled, engine=engine, threshold=0)
+    return list(tmplt._parse_blocks(lines))
 
 
 class Class_mapsTemplate(NetworkTemplate):
-    def __init__(self, lines=None, module=None):
+    # class-map blocks sent to a worker process at a time
+    CHUNK_SIZE = 1000
+
+    def __init__(
+        self, lines=None, module=None, compiled=True, engine=None, threshold=None, processes=None
+    ):
         super(Class_mapsTemplate, self).__init__(lines=lines, tmplt=self, module=module)
+        self._compiled = compiled
+        self._engine = engine or os.environ.get(PARSE_ENGINE_ENV) or "regex"
+        if self._engine not in PARSE_ENGINES:
+            raise ValueError(
+                "Unsupported class-map parse engine {0}, expected one of {1}".format(
+                    self._engine, ", ".join(PARSE_ENGINES)
+                )
+            )
+        if threshold is None:
+            threshold = os.environ.get(PARALLEL_THRESHOLD_ENV) or 0
+        if processes is None:
+            processes = os.environ.get(PARALLEL_PROCESSES_ENV) or _cpu_count()
+        self._threshold = int(threshold)
+        self._processes = int(processes)
+
+    _index = None
+    _candidates = None
+    _parsers = None
+
+    # criterion keyword -> [(parser name, grammar), ...] in PARSERS order
+    GRAMMAR = {
+        "access-group": [("match access group", _grammar_match_access_group)],
+        "any": [("match any", _grammar_match_any)],
+        "application": [
+            ("match application", _grammar_match_application),
+            ("match application attribute", _grammar_match_application_attribute),
+            ("match application group", _grammar_match_application_group),
+        ],
+        "class-map": [("match class-map", _grammar_match_class_map)],
+        "cac": [("match cac status", _grammar_match_cac_status)],
+        "cos": [
+            ("match cos", _grammar_match_cos),
+            ("match cos inner", _grammar_match_cos_inner),
+        ],
+        "destination-address": [("match destination mac", _grammar_match_destination_mac)],
+        "discard-class": [("match discard class", _grammar_match_discard_class)],
+        "group-object": [("match object-group security", _grammar_match_object_group_security)],
+        "input-interface": [("match input-interface", _grammar_match_input_interface)],
+        "dscp": [("match dscp", _grammar_match_dscp)],
+        "ip": [
+            ("match ip dscp", _grammar_match_ip_dscp),
+            ("match ip precedence", _grammar_match_ip_precedence),
+            ("match ip rtp", _grammar_match_ip_rtp),
+        ],
+        "metadata": [("match metadata", _grammar_match_metadata)],
+        "mpls": [("match mpls experimental", _grammar_match_mpls_experimental)],
+        "packet": [("match packet length", _grammar_match_packet_length)],
+        "protocol": [
+            ("match protocol attribute", _grammar_match_protocol_attribute),
+            ("match protocol", _grammar_match_protocol),
+        ],
+        "qos-group": [("match qos group", _grammar_match_qos_group)],
+        "security-group": [("match security group", _grammar_match_security_group)],
+        "source-address": [("match source mac", _grammar_match_source_mac)],
+        "start": [("match start eq or neq", _grammar_match_start)],
+        "vlan": [
+            ("match vlan", _grammar_match_vlan),
+            ("match vlan inner", _grammar_match_vlan_inner),
+        ],
+        "traffic-category": [("match traffic category", _grammar_match_traffic_category)],
+    }
 
     DSCP_VALUES = {
         "af11": "40",
@@ -51,12 +1215,13 @@ class Class_mapsTemplate(NetworkTemplate):
     PARSERS = [
         {
             "name": "class-map",
-            "getval": re.compile(
+            "getval": LazyPattern(
                 r"""^\s*class-map
                     \s(?P<match_type>match-any|match-all)
                     \s(?P<class_map_name>\S+)
                 \s*$""",
                 re.VERBOSE),
+            "compiled_result": _result_class_map,
             "result": {
                 "{{ class_map_name|d() }}": {
                     "class_map_type": "{{ class_map_type }}",
@@ -64,33 +1229,37 @@ class Class_mapsTemplate(NetworkTemplate):
                     "match_type": "{{ match_type }}"
                 }
             },
+            "compiled_setval": _tmplt_class_map,
             "setval": "class-map {{ match_type if match_type is defined else '' }} {{ name }}",
             "compval": "name",
             "shared": True
         },
         {
             "name": "description",
-            "getval": re.compile(
+            "getval": LazyPattern(
                 r"""^\s*description
                     \s(?P<description>.+)
                 \s*$""",
                 re.VERBOSE),
+            "compiled_result": _result_description,
             "result": {
                 "{{ class_map_name|d() }}": {
                     "description": "{{ description }}"
                 }
             },
             "compval": "description",
+            "compiled_setval": _tmplt_description,
             "setval": "description {{ description }}"
         },
         {
             "name": "match access group",
-            "getval": re.compile(
+            "getval": LazyPattern(
                 r"""^\s*match(\s(?P<negate>not))?
                     \saccess-group
                     \s((?P<number>\S+)|(name\s(?P<name>\S+)))
                 \s*$""",
                 re.VERBOSE),
+            "compiled_result": _result_match_access_group,
             "result": {
                 "{{ class_map_name|d() }}": {
                     "matches": [
@@ -105,16 +1274,18 @@ class Class_mapsTemplate(NetworkTemplate):
                 }
             },
             "compval": "access_group",
+            "compiled_setval": _tmplt_match_access_group,
             "setval": "match{{ ' not' if negate is defined and negate else '' }} access-group "
             "{{ access_group.number if access_group.number is defined else 'name ' + access_group.name }}",
         },
         {
             "name": "match any",
-            "getval": re.compile(
+            "getval": LazyPattern(
                 r"""^\s*match
                     \sany
                 \s*$""",
                 re.VERBOSE),
+            "compiled_result": _result_match_any,
             "result": {
                 "{{ class_map_name|d() }}": {
                     "matches": [
@@ -125,11 +1296,12 @@ class Class_mapsTemplate(NetworkTemplate):
                 }
             },
             "compval": "any",
+            "compiled_setval": _tmplt_match_any,
             "setval": "{{ 'match any' if any else '' }}"
         },
         {
             "name": "match application",
-            "getval": re.compile(
+            "getval": LazyPattern(
                 r"""^\s*match(\s(?P<negate>not))?
                     \sapplication
                     \s(?P<name>\S+)
@@ -138,6 +1310,7 @@ class Class_mapsTemplate(NetworkTemplate):
                     (\sversion\s(?P<version>\S+))?
                 \s*$""",
                 re.VERBOSE),
+            "compiled_result": _result_match_application,
             "result": {
                 "{{ class_map_name|d() }}": {
                     "matches": [
@@ -154,6 +1327,7 @@ class Class_mapsTemplate(NetworkTemplate):
                 },
             },
             "compval": "application",
+            "compiled_setval": _tmplt_match_application,
             "setval": "match{{ ' not' if negate is defined and negate else '' }} application "
             "{{ application.name }} "
             "{{ 'source ' + application.source if application.source is defined }}"
@@ -162,7 +1336,7 @@ class Class_mapsTemplate(NetworkTemplate):
         },
         {
             "name": "match application attribute",
-            "getval": re.compile(
+            "getval": LazyPattern(
                 r"""^\s*match(\s(?P<negate>not))?
                     \sapplication
                     \sattribute
@@ -170,6 +1344,7 @@ class Class_mapsTemplate(NetworkTemplate):
                     \s(?P<value>\S+)
                 \s*$""",
                 re.VERBOSE),
+            "compiled_result": _result_match_application_attribute,
             "result": {
                 "{{ class_map_name|d() }}": {
                     "matches": [
@@ -183,6 +1358,7 @@ class Class_mapsTemplate(NetworkTemplate):
                 }
             },
             "compval": "application_attribute",
+            "compiled_setval": _tmplt_match_application_attribute,
             "setval": "match{{ ' not' if negate is defined and negate else '' }} application attribute "
             "{{ 'category ' + application_attribute.category if application_attribute.category is defined }}"
             "{{ 'device-class ' + application_attribute.device_class if application_attribute.device_class is defined }}"
@@ -192,13 +1368,14 @@ class Class_mapsTemplate(NetworkTemplate):
         },
         {
             "name": "match application group",
-            "getval": re.compile(
+            "getval": LazyPattern(
                 r"""^\s*match(\s(?P<negate>not))?
                     \sapplication
                     \sapplication-group
                     \s(?P<application_group>telepresence-group|vmware-group|webex-group)
                 \s*$""",
                 re.VERBOSE),
+            "compiled_result": _result_match_application_group,
             "result": {
                 "{{ class_map_name|d() }}": {
                     "matches": [
@@ -210,16 +1387,18 @@ class Class_mapsTemplate(NetworkTemplate):
                 }
             },
             "compval": "application_group",
+            "compiled_setval": _tmplt_match_application_group,
             "setval": "match{{ ' not' if negate is defined and negate else '' }} application application-group {{ application_group }}"
         },
         {
             "name": "match class-map",
-            "getval": re.compile(
+            "getval": LazyPattern(
                 r"""^\s*match(\s(?P<negate>not))?
                     \sclass-map
                     \s(?P<class_map>\S+)
                 \s*$""",
                 re.VERBOSE),
+            "compiled_result": _result_match_class_map,
             "result": {
                 "{{ class_map_name|d() }}": {
                     "matches": [
@@ -231,17 +1410,19 @@ class Class_mapsTemplate(NetworkTemplate):
                 }
             },
             "compval": "class_map",
+            "compiled_setval": _tmplt_match_class_map,
             "setval": "match{{ ' not' if negate is defined and negate else '' }} class-map {{ class_map }}"
         },
         {
             "name": "match cac status",
-            "getval": re.compile(
+            "getval": LazyPattern(
                 r"""^\s*match(\s(?P<negate>not))?
                     \scac
                     \sstatus
                     \s(?P<cac_status>admitted|un-admitted)
                 \s*$""",
                 re.VERBOSE),
+            "compiled_result": _result_match_cac_status,
             "result": {
                 "{{ class_map_name|d() }}": {
                     "matches": [
@@ -253,86 +1434,68 @@ class Class_mapsTemplate(NetworkTemplate):
                 }
             },
             "compval": "cac_status",
+            "compiled_setval": _tmplt_match_cac_status,
             "setval": "match{{ ' not' if negate is defined and negate else '' }} cac status {{ cac_status }}"
         },
         {
             "name": "match cos",
-            "getval": re.compile(
+            "getval": LazyPattern(
                 r"""^\s*match(\s(?P<negate>not))?
                     \scos
-                    \s* (?P<cos_val_0>\d)
-                    (\s*(?P<cos_val_1>\d))?
-                    (\s*(?P<cos_val_2>\d))?
-                    (\s*(?P<cos_val_3>\d))?
-                    (\s*(?P<cos_val_4>\d))?
-                    (\s*(?P<cos_val_5>\d))?
-                    (\s*(?P<cos_val_6>\d))?
-                    (\s*(?P<cos_val_7>\d))?
+                    \s*(?P<cos>\d(\s*\d)*)
                 \s*$""",
                 re.VERBOSE),
+            "compiled_result": _result_match_cos,
             "result": {
                 "{{ class_map_name|d() }}": {
                     "matches": [
                         {
-                            "cos": [
-                                "{{ cos_val_0 if cos_val_0 is defined else None }}",
-                                "{{ cos_val_1 if cos_val_1 is defined else None }}",
-                                "{{ cos_val_2 if cos_val_2 is defined else None }}",
-                                "{{ cos_val_3 if cos_val_3 is defined else None }}",
-                                "{{ cos_val_4 if cos_val_4 is defined else None }}",
-                                "{{ cos_val_5 if cos_val_5 is defined else None }}",
-                                "{{ cos_val_6 if cos_val_6 is defined else None }}",
-                                "{{ cos_val_7 if cos_val_7 is defined else None }}"
-                            ],
+                            "cos": "{{ cos.split()|join|list|map('int')|unique|sort|list }}",
                             "negate": "{{ not not negate }}"
                         }
                     ]
                 }
             },
             "compval": "cos",
+            "compiled_setval": _tmplt_match_cos,
             "setval": "match{{ ' not' if negate is defined and negate else '' }} cos"
             "{% for cos_value in cos %} {{ cos_value }}{% endfor %}"
         },
         {
             "name": "match cos inner",
-            "getval": re.compile(
+            "getval": LazyPattern(
                 r"""^\s*match(\s(?P<negate>not))?
                     \scos
                     \sinner
-                    \s* (?P<cos_inner_val_0>\d)
-                    (\s*(?P<cos_inner_val_1>\d))?
-                    (\s*(?P<cos_inner_val_2>\d))?
-                    (\s*(?P<cos_inner_val_3>\d))?
+                    \s*(?P<cos_inner>\d(\s*\d)*)
                 \s*$""",
                 re.VERBOSE),
+            "compiled_result": _result_match_cos_inner,
             "result": {
                 "{{ class_map_name|d() }}": {
                     "matches": [
                         {
-                            "cos_inner": [
-                                "{{ cos_inner_val_0 if cos_inner_val_0 is defined else None }}",
-                                "{{ cos_inner_val_1 if cos_inner_val_1 is defined else None }}",
-                                "{{ cos_inner_val_2 if cos_inner_val_2 is defined else None }}",
-                                "{{ cos_inner_val_3 if cos_inner_val_3 is defined else None }}",
-                            ],
+                            "cos_inner": "{{ cos_inner.split()|join|list|map('int')|unique|sort|list }}",
                             "negate": "{{ not not negate }}"
                         }
                     ]
                 }
             },
             "compval": "cos_inner",
+            "compiled_setval": _tmplt_match_cos_inner,
             "setval": "match{{ ' not' if negate is defined and negate else '' }} cos inner"
             "{% for cos_inner_value in cos_inner %} {{ cos_inner_value }}{% endfor %}"
         },
         {
             "name": "match destination mac",
-            "getval": re.compile(
+            "getval": LazyPattern(
                 r"""^\s*match(\s(?P<negate>not))?
                     \sdestination-address
                     \smac
                     \s(?P<dest_mac>\S+)
                 \s*$""",
                 re.VERBOSE),
+            "compiled_result": _result_match_destination_mac,
             "result": {
                 "{{ class_map_name|d() }}": {
                     "matches": [
@@ -344,17 +1507,19 @@ class Class_mapsTemplate(NetworkTemplate):
                 }
             },
             "compval": "destination_mac_address",
+            "compiled_setval": _tmplt_match_destination_mac,
             "setval": "match{{ ' not' if negate is defined and negate else '' }} destination-address mac "
             "{{ destination_mac_address }}"
         },
         {
             "name": "match discard class",
-            "getval": re.compile(
+            "getval": LazyPattern(
                 r"""^\s*match(\s(?P<negate>not))?
                     \sdiscard-class
                     \s(?P<discard_class>\d)
                 \s*$""",
                 re.VERBOSE),
+            "compiled_result": _result_match_discard_class,
             "result": {
                 "{{ class_map_name|d() }}": {
                     "matches": [
@@ -366,12 +1531,13 @@ class Class_mapsTemplate(NetworkTemplate):
                 }
             },
             "compval": "discard_class",
+            "compiled_setval": _tmplt_match_discard_class,
             "setval": "match{{ ' not' if negate is defined and negate else '' }} discard-class "
             "{{ discard_class }}"
         },
         {
             "name": "match object-group security",
-            "getval": re.compile(
+            "getval": LazyPattern(
                 r"""^\s*match(\s(?P<negate>not))?
                     \sgroup-object
                     \ssecurity
@@ -379,6 +1545,7 @@ class Class_mapsTemplate(NetworkTemplate):
                     \s(?P<name>\S+)
                 \s*$""",
                 re.VERBOSE),
+            "compiled_result": _result_match_object_group_security,
             "result": {
                 "{{ class_map_name|d() }}": {
                     "matches": [
@@ -393,17 +1560,19 @@ class Class_mapsTemplate(NetworkTemplate):
                 }
             },
             "compval": "object_group_security",
+            "compiled_setval": _tmplt_match_object_group_security,
             "setval": "match{{ ' not' if negate is defined and negate else '' }} group-object security "
             "{{ object_group_security.endpoint }} {{ object_group_security.name }}"
         },
         {
             "name": "match input-interface",
-            "getval": re.compile(
+            "getval": LazyPattern(
                 r"""^\s*match(\s(?P<negate>not))?
                     \sinput-interface
-                    \s(?P<interface_type>\S+)(?P<interface_number>\d+)
+                    \s(?P<interface_type>\S*\D)(?P<interface_number>\d+)
                 \s*$""",
                 re.VERBOSE),
+            "compiled_result": _result_match_input_interface,
             "result": {
                 "{{ class_map_name|d() }}": {
                     "matches": [
@@ -418,39 +1587,31 @@ class Class_mapsTemplate(NetworkTemplate):
                 }
             },
             "compval": "input_interface",
+            "compiled_setval": _tmplt_match_input_interface,
             "setval": "match{{ ' not' if negate is defined and negate else '' }} input-interface "
             "{{ input_interface.interface_type }} {{ input_interface.interface_number }}"
         },
         {
             "name": "match dscp",
-            "getval": re.compile(
+            "getval": LazyPattern(
                 r"""^\s*match(\s(?P<negate>not))?
                     \sdscp
-                    \s* (?P<dscp_val_0>\S+)
-                    (\s*(?P<dscp_val_1>\S+))?
-                    (\s*(?P<dscp_val_2>\S+))?
-                    (\s*(?P<dscp_val_3>\S+))?
-                    (\s*(?P<dscp_val_4>\S+))?
-                    (\s*(?P<dscp_val_5>\S+))?
-                    (\s*(?P<dscp_val_6>\S+))?
-                    (\s*(?P<dscp_val_7>\S+))?
+                    \s*(?P<dscp>\S+(\s+\S+)*)
                 \s*$""",
                 re.VERBOSE),
+            "compiled_result": _result_match_dscp,
             "result": {
                 "{{ class_map_name|d() }}": {
                     "matches": [
                         {
                             "dscp": {
-                                "dscp_values": [
-                                    "{{ dscp_val_0 if dscp_val_0 is defined else None }}",
-                                    "{{ dscp_val_1 if dscp_val_1 is defined else None }}",
-                                    "{{ dscp_val_2 if dscp_val_2 is defined else None }}",
-                                    "{{ dscp_val_3 if dscp_val_3 is defined else None }}",
-                                    "{{ dscp_val_4 if dscp_val_4 is defined else None }}",
-                                    "{{ dscp_val_5 if dscp_val_5 is defined else None }}",
-                                    "{{ dscp_val_6 if dscp_val_6 is defined else None }}",
-                                    "{{ dscp_val_7 if dscp_val_7 is defined else None }}"
-                                ]
+                                "dscp_values": (
+                                    "{% set ns = namespace(values=[]) %}"
+                                    "{% for value in dscp.split() %}"
+                                    "{% set ns.values = ns.values + [" + str(DSCP_VALUES) + ".get(value, value)] %}"
+                                    "{% endfor %}"
+                                    "{{ ns.values|unique(case_sensitive=True)|sort(case_sensitive=True)|list }}"
+                                )
                             },
                             "negate": "{{ not not negate }}"
                         }
@@ -460,34 +1621,25 @@ class Class_mapsTemplate(NetworkTemplate):
         },
         {
             "name": "match ip dscp",
-            "getval": re.compile(
+            "getval": LazyPattern(
                 r"""^\s*match(\s(?P<negate>not))?
                     \sip\sdscp
-                    \s* (?P<dscp_val_0>\S+)
-                    (\s*(?P<dscp_val_1>\S+))?
-                    (\s*(?P<dscp_val_2>\S+))?
-                    (\s*(?P<dscp_val_3>\S+))?
-                    (\s*(?P<dscp_val_4>\S+))?
-                    (\s*(?P<dscp_val_5>\S+))?
-                    (\s*(?P<dscp_val_6>\S+))?
-                    (\s*(?P<dscp_val_7>\S+))?
+                    \s*(?P<dscp>\S+(\s+\S+)*)
                 \s*$""",
                 re.VERBOSE),
+            "compiled_result": _result_match_ip_dscp,
             "result": {
                 "{{ class_map_name|d() }}": {
                     "matches": [
                         {
                             "dscp": {
-                                "dscp_values": [
-                                    "{{ dscp_val_0 if dscp_val_0 is defined else None }}",
-                                    "{{ dscp_val_1 if dscp_val_1 is defined else None }}",
-                                    "{{ dscp_val_2 if dscp_val_2 is defined else None }}",
-                                    "{{ dscp_val_3 if dscp_val_3 is defined else None }}",
-                                    "{{ dscp_val_4 if dscp_val_4 is defined else None }}",
-                                    "{{ dscp_val_5 if dscp_val_5 is defined else None }}",
-                                    "{{ dscp_val_6 if dscp_val_6 is defined else None }}",
-                                    "{{ dscp_val_7 if dscp_val_7 is defined else None }}"
-                                ],
+                                "dscp_values": (
+                                    "{% set ns = namespace(values=[]) %}"
+                                    "{% for value in dscp.split() %}"
+                                    "{% set ns.values = ns.values + [" + str(DSCP_VALUES) + ".get(value, value)] %}"
+                                    "{% endfor %}"
+                                    "{{ ns.values|unique(case_sensitive=True)|sort(case_sensitive=True)|list }}"
+                                ),
                                 "ip_versions": "ipv4"
                             },
                             "negate": "{{ not not negate }}"
@@ -496,44 +1648,39 @@ class Class_mapsTemplate(NetworkTemplate):
                 }
             },
             "compval": "dscp",
+            "compiled_setval": _tmplt_match_ip_dscp,
             "setval": "match{{ ' not' if negate is defined and negate else '' }}"
             "{{ ' ip' if dscp.ip_versions == 'ipv4' }} dscp"
             "{% for dscp_value in dscp.dscp_values %} {{ dscp_value }}{% endfor %}"
         },
         {
             "name": "match ip precedence",
-            "getval": re.compile(
+            "getval": LazyPattern(
                 r"""^\s*match(\s(?P<negate>not))?
                     \sip
                     \sprecedence
-                    \s* (?P<precedence_val_0>\d)
-                    (\s*(?P<precedence_val_1>\d))?
-                    (\s*(?P<precedence_val_2>\d))?
-                    (\s*(?P<precedence_val_3>\d))?
+                    \s*(?P<precedence>\d(\s*\d)*)
                 \s*$""",
                 re.VERBOSE),
+            "compiled_result": _result_match_ip_precedence,
             "result": {
                 "{{ class_map_name|d() }}": {
                     "matches": [
                         {
-                            "ip_precedence": [
-                                "{{ precedence_val_0 if precedence_val_0 is defined else None }}",
-                                "{{ precedence_val_1 if precedence_val_1 is defined else None }}",
-                                "{{ precedence_val_2 if precedence_val_2 is defined else None }}",
-                                "{{ precedence_val_3 if precedence_val_3 is defined else None }}",
-                            ],
+                            "ip_precedence": "{{ precedence.split()|join|list|map('int')|unique|sort|list }}",
                             "negate": "{{ not not negate }}"
                         }
                     ]
                 }
             },
             "compval": "ip_precedence",
+            "compiled_setval": _tmplt_match_ip_precedence,
             "setval": "match{{ ' not' if negate is defined and negate else '' }} ip precedence"
             "{% for precedence_value in ip_precedence %} {{ precedence_value }}{% endfor %}"
         },
         {
             "name": "match ip rtp",
-            "getval": re.compile(
+            "getval": LazyPattern(
                 r"""^\s*match(\s(?P<negate>not))?
                     \sip
                     \srtp
@@ -541,6 +1688,7 @@ class Class_mapsTemplate(NetworkTemplate):
                     \s(?P<port_range>\d{1,5})
                 \s*$""",
                 re.VERBOSE),
+            "compiled_result": _result_match_ip_rtp,
             "result": {
                 "{{ class_map_name|d() }}": {
                     "matches": [
@@ -555,18 +1703,20 @@ class Class_mapsTemplate(NetworkTemplate):
                 }
             },
             "compval": "ip_rtp",
+            "compiled_setval": _tmplt_match_ip_rtp,
             "setval": "match{{ ' not' if negate is defined and negate else '' }} "
             "ip rtp {{ ip_rtp.starting_port_number }} {{ ip_rtp.port_range }}"
         },
         {
             "name": "match metadata",
-            "getval": re.compile(
+            "getval": LazyPattern(
                 r"""^\s*match(\s(?P<negate>not))?
                     \smetadata
                     \s(?P<metadata_type>(cac\sstatus)|(called-uri)|(calling-uri)|(device-model)|(global-session-id)|(multi-party-session-id))
                     \s(?P<metadata_value>\S+)
                 \s*$""",
                 re.VERBOSE),
+            "compiled_result": _result_match_metadata,
             "result": {
                 "{{ class_map_name|d() }}": {
                     "matches": [
@@ -580,6 +1730,7 @@ class Class_mapsTemplate(NetworkTemplate):
                 }
             },
             "compval": "metadata",
+            "compiled_setval": _tmplt_match_metadata,
             "setval": "match{{ ' not' if negate is defined and negate else '' }} metadata "
             "{{ 'cac status ' + metadata.cac_status if metadata.cac_status is defined }}"
             "{{ 'called-uri ' + metadata.called_uri if metadata.called_uri is defined }}"
@@ -590,51 +1741,38 @@ class Class_mapsTemplate(NetworkTemplate):
         },
         {
             "name": "match mpls experimental",
-            "getval": re.compile(
+            "getval": LazyPattern(
                 r"""^\s*match(\s(?P<negate>not))?
                     \smpls\sexperimental\stopmost
-                    \s* (?P<mpls_val_0>\d)
-                    (\s*(?P<mpls_val_1>\d))?
-                    (\s*(?P<mpls_val_2>\d))?
-                    (\s*(?P<mpls_val_3>\d))?
-                    (\s*(?P<mpls_val_4>\d))?
-                    (\s*(?P<mpls_val_5>\d))?
-                    (\s*(?P<mpls_val_6>\d))?
-                    (\s*(?P<mpls_val_7>\d))?
+                    \s*(?P<mpls>\d(\s*\d)*)
                 \s*$""",
                 re.VERBOSE),
+            "compiled_result": _result_match_mpls_experimental,
             "result": {
                 "{{ class_map_name|d() }}": {
                     "matches": [
                         {
-                            "mpls_experimental_topmost": [
-                                "{{ mpls_val_0 if mpls_val_0 is defined else None }}",
-                                "{{ mpls_val_1 if mpls_val_1 is defined else None }}",
-                                "{{ mpls_val_2 if mpls_val_2 is defined else None }}",
-                                "{{ mpls_val_3 if mpls_val_3 is defined else None }}",
-                                "{{ mpls_val_4 if mpls_val_4 is defined else None }}",
-                                "{{ mpls_val_5 if mpls_val_5 is defined else None }}",
-                                "{{ mpls_val_6 if mpls_val_6 is defined else None }}",
-                                "{{ mpls_val_7 if mpls_val_7 is defined else None }}"
-                            ],
+                            "mpls_experimental_topmost": "{{ mpls.split()|join|list|map('int')|unique|sort|list }}",
                             "negate": "{{ not not negate }}"
                         }
                     ]
                 }
             },
             "compval": "mpls_experimental_topmost",
+            "compiled_setval": _tmplt_match_mpls_experimental,
             "setval": "match{{ ' not' if negate is defined and negate else '' }} mpls experimental topmost"
             "{% for mpls_val in mpls_experimental_topmost %} {{ mpls_val }}{% endfor %}"
         },
         {
             "name": "match packet length",
-            "getval": re.compile(
+            "getval": LazyPattern(
                 r"""^\s*match(\s(?P<negate>not))?
                     \spacket
                     \slength
                     ((\smin\s(?P<min>\d{1,4}))|(\smax\s(?P<max>\d{1,4}))){1,2}
                 \s*$""",
                 re.VERBOSE),
+            "compiled_result": _result_match_packet_length,
             "result": {
                 "{{ class_map_name|d() }}": {
                     "matches": [
@@ -649,13 +1787,14 @@ class Class_mapsTemplate(NetworkTemplate):
                 }
             },
             "compval": "packet_length",
+            "compiled_setval": _tmplt_match_packet_length,
             "setval": "match{{ ' not' if negate is defined and negate else '' }} packet length"
             "{{ ' min ' + packet_length.min|string if packet_length.min is defined }}"
             "{{ ' max ' + packet_length.max|string if packet_length.max is defined }}"
         },
         {
             "name": "match protocol attribute",
-            "getval": re.compile(
+            "getval": LazyPattern(
                 r"""^\s*match(\s(?P<negate>not))?
                     \sprotocol
                     \sattribute
@@ -663,6 +1802,7 @@ class Class_mapsTemplate(NetworkTemplate):
                     \s(?P<attribute_value>\S+)
                 \s*$""",
                 re.VERBOSE),
+            "compiled_result": _result_match_protocol_attribute,
             "result": {
                 "{{ class_map_name|d() }}": {
                     "matches": [
@@ -677,12 +1817,13 @@ class Class_mapsTemplate(NetworkTemplate):
                 }
             },
             "compval": "protocol_attribute",
+            "compiled_setval": _tmplt_match_protocol_attribute,
             "setval": "match{{ ' not' if negate is defined and negate else '' }} protocol attribute "
             "{{ protocol_attribute.attribute_name }} {{ protocol_attribute.attribute_value }}"
         },
         {
             "name": "match protocol",
-            "getval": re.compile(
+            "getval": LazyPattern(
                 r"""^\s*match(\s(?P<negate>not))?
                     \s(protocol)
                     \s(?P<protocol_name>\S+)
@@ -690,6 +1831,7 @@ class Class_mapsTemplate(NetworkTemplate):
                     \s"(?P<subprotocol_parameter_value>.+)")?
                 \s*$""",
                 re.VERBOSE),
+            "compiled_result": _result_match_protocol,
             "result": {
                 "{{ class_map_name|d() }}": {
                     "matches": [
@@ -707,6 +1849,7 @@ class Class_mapsTemplate(NetworkTemplate):
                 }
             },
             "compval": "protocol",
+            "compiled_setval": _tmplt_match_protocol,
             "setval": "match{{ ' not' if negate is defined and negate else '' }} protocol "
             "{{ protocol.protocol_name }}"
             "{{ ' ' + protocol.subprotocol_parameter.subprotocol_parameter_name "
@@ -716,12 +1859,13 @@ class Class_mapsTemplate(NetworkTemplate):
         },
         {
             "name": "match qos group",
-            "getval": re.compile(
+            "getval": LazyPattern(
                 r"""^\s*match(\s(?P<negate>not))?
                     \sqos-group
                     \s(?P<qos_group_num>\d{1,2})
                 \s*$""",
                 re.VERBOSE),
+            "compiled_result": _result_match_qos_group,
             "result": {
                 "{{ class_map_name|d() }}": {
                     "matches": [
@@ -733,18 +1877,20 @@ class Class_mapsTemplate(NetworkTemplate):
                 }
             },
             "compval": "qos_group",
+            "compiled_setval": _tmplt_match_qos_group,
             "setval": "match{{ ' not' if negate is defined and negate else '' }} qos-group "
             "{{ qos_group }}"
         },
         {
             "name": "match security group",
-            "getval": re.compile(
+            "getval": LazyPattern(
                 r"""^\s*match(\s(?P<negate>not))?
                     \ssecurity-group
                     \s(?P<direction>(destination\stag)|(source\stag))
                     \s(?P<num>\d{1,5})
                 \s*$""",
                 re.VERBOSE),
+            "compiled_result": _result_match_security_group,
             "result": {
                 "{{ class_map_name|d() }}": {
                     "matches": [
@@ -758,19 +1904,21 @@ class Class_mapsTemplate(NetworkTemplate):
                 }
             },
             "compval": "security_group",
+            "compiled_setval": _tmplt_match_security_group,
             "setval": "match{{ ' not' if negate is defined and negate else '' }} security-group"
             "{{ ' destination tag ' + security_group.destination_tag|string if security_group.destination_tag is defined }}"
             "{{ ' source tag ' + security_group.source_tag|string if security_group.source_tag is defined }}"
         },
         {
             "name": "match source mac",
-            "getval": re.compile(
+            "getval": LazyPattern(
                 r"""^\s*match(\s(?P<negate>not))?
                     \ssource-address
                     \smac
                     \s(?P<source_mac>\S+)
                 \s*$""",
                 re.VERBOSE),
+            "compiled_result": _result_match_source_mac,
             "result": {
                 "{{ class_map_name|d() }}": {
                     "matches": [
@@ -782,12 +1930,13 @@ class Class_mapsTemplate(NetworkTemplate):
                 }
             },
             "compval": "source_mac_address",
+            "compiled_setval": _tmplt_match_source_mac,
             "setval": "match{{ ' not' if negate is defined and negate else '' }} source-address mac "
             "{{ source_mac_address }}"
         },
         {
             "name": "match start eq or neq",
-            "getval": re.compile(
+            "getval": LazyPattern(
                 r"""^\s*match(\s(?P<negate>not))?
                     \sstart
                     \s(?P<layer>l2|l3)-start
@@ -801,6 +1950,7 @@ class Class_mapsTemplate(NetworkTemplate):
                     \s(?P<mask>\S+))?
                 \s*$""",
                 re.VERBOSE),
+            "compiled_result": _result_match_start,
             "result": {
                 "{{ class_map_name|d() }}": {
                     "matches": [
@@ -821,12 +1971,13 @@ class Class_mapsTemplate(NetworkTemplate):
         },
         {
             "name": "match vlan",
-            "getval": re.compile(
+            "getval": LazyPattern(
                 r"""^\s*match(\s(?P<negate>not))?
                     \svlan
                     \s*(?P<id>\d{1,4})
                 \s*$""",
                 re.VERBOSE),
+            "compiled_result": _result_match_vlan,
             "result": {
                 "{{ class_map_name|d() }}": {
                     "matches": [
@@ -838,18 +1989,20 @@ class Class_mapsTemplate(NetworkTemplate):
                 }
             },
             "compval": "vlan",
+            "compiled_setval": _tmplt_match_vlan,
             "setval": "match{{ ' not' if negate is defined and negate else '' }} "
             "vlan {{ vlan }}",
         },
         {
             "name": "match vlan inner",
-            "getval": re.compile(
+            "getval": LazyPattern(
                 r"""^\s*match(\s(?P<negate>not))?
                     \svlan
                     \sinner
                     \s*(?P<id>\d{1,4})
                 \s*$""",
                 re.VERBOSE),
+            "compiled_result": _result_match_vlan_inner,
             "result": {
                 "{{ class_map_name|d() }}": {
                     "matches": [
@@ -861,17 +2014,19 @@ class Class_mapsTemplate(NetworkTemplate):
                 }
             },
             "compval": "vlan_inner",
+            "compiled_setval": _tmplt_match_vlan_inner,
             "setval": "match{{ ' not' if negate is defined and negate else '' }} "
             "vlan inner {{ vlan_inner }}",
         },
         {
             "name": "match traffic category",
-            "getval": re.compile(
+            "getval": LazyPattern(
                 r"""^\s*match(\s(?P<negate>not))?
                     \straffic-category
                     \s(?P<traffic_category>allow|optimize)
                 \s*$""",
                 re.VERBOSE),
+            "compiled_result": _result_match_traffic_category,
             "result": {
                 "{{ class_map_name|d() }}": {
                     "matches": [
@@ -883,8 +2038,307 @@ class Class_mapsTemplate(NetworkTemplate):
                 }
             },
             "compval": "traffic_category",
+            "compiled_setval": _tmplt_match_traffic_category,
             "setval": "match{{ ' not' if negate is defined and negate else '' }} "
             "traffic-category {{ traffic_category }}",
         },
     ]
     # fmt: on
+
+    @classmethod
+    def get_index(cls):
+        """Build (once) the dispatch index of the parsers
+
+        The parsers are grouped by the first token of the lines they can match
+        (`class-map`, `description`, `match`). Parsers of `match` lines are further
+        keyed by the criterion keyword following the optional `not`.
+
+        :rtype: dict
+        :returns: a dictionary of `head -> [(keyword, parser), ...]` in PARSERS order
+        """
+        if cls._index is None:
+            index = {}
+            for parser in cls.PARSERS:
+                pattern = "".join(parser["getval"].pattern.split())
+                keywords = KEYWORDS_RE.match(pattern)
+                if keywords:
+                    index.setdefault(keywords.group("head"), []).append(
+                        (keywords.group("keyword"), parser)
+                    )
+                else:
+                    index.setdefault(None, []).append((None, parser))
+            cls._index = index
+            cls._candidates = {}
+        return cls._index
+
+    def get_candidates(self, line):
+        """Select the parsers that could match a line
+
+        A parser is a candidate, if the head of the line is the same, and the
+        criterion token of the line starts with the keyword of the parser. The
+        result keeps the order of PARSERS, so the first matching candidate is the
+        same parser as the first matching one in PARSERS.
+
+        :param line: a line of the configuration
+        :rtype: list
+        :returns: the candidate parsers
+        """
+        index = self.get_index()
+        tokens = line.split(None, 3)
+        if not tokens:
+            return index.get(None, [])
+
+        token = None
+        if len(tokens) > 1:
+            token = tokens[1]
+            if token == "not" and len(tokens) > 2:
+                token = tokens[2]
+
+        key = (tokens[0], token)
+        candidates = self._candidates.get(key)
+        if candidates is None:
+            entries = index.get(tokens[0], []) + index.get(None, [])
+            candidates = [
+                parser
+                for keyword, parser in entries
+                if keyword is None or (token is not None and token.startswith(keyword))
+            ]
+            self._candidates[key] = candidates
+        return candidates
+
+    def match_regex(self, line):
+        """Match a line against the candidate parsers' regexes
+
+        :param line: a line of the configuration
+        :rtype: tuple
+        :returns: the first matching parser and its captures, or None
+        """
+        for parser in self.get_candidates(line):
+            cap = parser["getval"].match(line)
+            if cap:
+                capdict = cap.groupdict()
+                capdict = dict((k, v) for k, v in capdict.items() if v is not None)
+                return parser, capdict
+        return None
+
+    def match_tokens(self, line):
+        """Match a line using the tokenizer and the grammar of the lines
+
+        The line is split once, and its tokens are checked by the GRAMMAR of
+        the criterion keyword, which returns the same captures the parser's
+        regex would. Lines the grammar does not recognise, and lines not in
+        the canonical single space separated form, are matched by the regexes.
+
+        :param line: a line of the configuration
+        :rtype: tuple
+        :returns: the first matching parser and its captures, or None
+        """
+        tokens = line.split()
+        capdict = None
+        if tokens and " ".join(tokens) == line.strip():
+            head = tokens[0]
+            if head == "match" and len(tokens) > 1:
+                negate = tokens[1] == "not"
+                keyword = tokens[2] if negate and len(tokens) > 2 else tokens[1]
+                rest = tokens[3:] if negate else tokens[2:]
+                for name, grammar in self.GRAMMAR.get(keyword, []):
+                    capdict = grammar(rest)
+                    if capdict is not None:
+                        parser = self.get_parser(name)
+                        if negate:
+                            if "negate" not in parser["getval"].groupindex:
+                                return self.match_regex(line)
+                            capdict["negate"] = "not"
+                        return parser, capdict
+            elif head == "class-map":
+                if len(tokens) == 3 and tokens[1] in ("match-any", "match-all"):
+                    capdict = {"match_type": tokens[1], "class_map_name": tokens[2]}
+            elif head == "description":
+                if len(tokens) > 1:
+                    capdict = {"description": line.lstrip()[len("description ") :]}
+            if capdict is not None:
+                return self.get_parser(head), capdict
+        return self.match_regex(line)
+
+    def _parse_blocks(self, lines=None):
+        """Parse the lines block by block
+
+        :param lines: the lines to parse, the lines of the template by default
+        :rtype: generator
+        :returns: a `(key, class-map)` tuple for every class-map block
+        """
+        match = self.match_tokens if self._engine == "tokenizer" else self.match_regex
+        block = {}
+        shared = {}
+        for line in self._lines if lines is None else lines:
+            matched = match(line)
+            if matched:
+                parser, capdict = matched
+                if parser.get("shared"):
+                    for item in block.items():
+                        yield item
+                    block = {}
+                    shared = capdict
+                vals = dict(capdict)
+                vals.update(shared)
+                if self._compiled and parser.get("compiled_result"):
+                    res = parser["compiled_result"](vals)
+                else:
+                    res = self._deepformat(deepcopy(parser["result"]), vals)
+                _merge(block, res)
+        for item in block.items():
+            yield item
+
+    def parse(self):
+        """Parse the lines using the selected engine
+
+        The `regex` engine tries the regexes of the parsers selected by the
+        dispatch index, the `tokenizer` engine checks the tokens of the line
+        against the GRAMMAR of the `match` lines. Both give the same captures.
+
+        Unless the template was created with `compiled=False`, the fragments
+        are built by the parsers' `compiled_result` callables instead of
+        rendering their Jinja `result` templates.
+
+        Configurations with `threshold` or more class-map blocks are parsed
+        by a pool of processes, see `_parse_chunks()`.
+
+        :rtype: dict
+        :returns: the parsed configuration
+        """
+        result = {}
+        for key, class_map in self._parse_chunks():
+            _merge(result, {key: class_map})
+        return result
+
+    def _parse_chunks(self, lines=None):
+        """Parse the lines, in a pool of processes if there are enough blocks
+
+        Configurations with at least `threshold` class-map blocks are split
+        into chunks of CHUNK_SIZE blocks, parsed by `processes` workers. Every
+        block parses the same alone, and the parsed chunks are yielded in the
+        order of the lines, so the result is the same as `_parse_blocks()`.
+
+        :param lines: the lines to parse, the lines of the template by default
+        :rtype: generator
+        :returns: a `(key, class-map)` tuple for every class-map block
+        """
+        context = fork_context()
+        if self._threshold <= 0 or self._processes < 2 or context is None:
+            for item in self._parse_blocks(lines):
+                yield item
+            return
+        blocks = self.split_blocks(lines)
+        head = list(islice(blocks, self._threshold))
+        if len(head) < self._threshold:
+            for item in self._parse_blocks(chain.from_iterable(head)):
+                yield item
+            return
+        pool = context.Pool(self._processes)
+        try:
+            for items in pool.imap(_parse_chunk, self._chunks(chain(head, blocks))):
+                for item in items:
+                    yield item
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def _chunks(self, blocks):
+        chunk = []
+        count = 0
+        for block in blocks:
+            chunk.extend(block)
+            count += 1
+            if count == self.CHUNK_SIZE:
+                yield chunk, self._compiled, self._engine
+                chunk = []
+                count = 0
+        if chunk:
+            yield chunk, self._compiled, self._engine
+
+    def split_blocks(self, lines=None):
+        """Split the lines into class-map blocks
+
+        A block starts with a line matched by the `shared` class-map parser,
+        the lines before the first one are a block too. Every block parses to
+        the same class-map alone as in the whole configuration.
+
+        :param lines: the lines to split, the lines of the template by default
+        :rtype: generator
+        :returns: the lines of every block
+        """
+        header = [parser for parser in self.PARSERS if parser.get("shared")][0]["getval"]
+        block = []
+        for line in self._lines if lines is None else lines:
+            if block and header.match(line):
+                yield block
+                block = []
+            block.append(line)
+        if block:
+            yield block
+
+    def parse_incremental(self, fragments, lines=None):
+        """Parse the changed class-map blocks only
+
+        Every block is looked up by the digest of its lines in `fragments`,
+        the class-maps parsed from the blocks before. Only the blocks not
+        found there are parsed. `counters` tells how many blocks were found
+        and parsed, `fragments` holds the class-maps of the current blocks.
+
+        :param fragments: a dict of `digest -> [[key, class-map], ...]`
+        :param lines: the lines to parse, the lines of the template by default
+        :rtype: generator
+        :returns: the parsed class-maps, like `parse_iter()`
+        """
+        self.counters = {"cached": 0, "parsed": 0}
+        self.fragments = {}
+        for block in self.split_blocks(lines):
+            digest = hashlib.sha1(to_bytes("\n".join(block), errors="surrogate_or_strict"))
+            digest = digest.hexdigest()
+            items = fragments.get(digest)
+            if items is None:
+                items = [list(item) for item in self._parse_blocks(block)]
+                self.counters["parsed"] += 1
+            else:
+                self.counters["cached"] += 1
+            self.fragments[digest] = items
+            for _key, class_map in items:
+                yield class_map
+
+    def parse_iter(self, lines=None):
+        """Parse lines lazily, yielding each class-map when its block closes
+
+        A block starts with a `class-map` line, and closes when the next one
+        starts or the lines run out. The lines can be any iterable, like the
+        `iter_lines` of the running-config. A class-map configured in several
+        blocks is yielded once for each of them, `parse()` merges them. Large
+        configurations are parsed in parallel, like by `parse()`.
+
+        :param lines: the lines to parse, the lines of the template by default
+        :rtype: generator
+        :returns: the parsed class-maps
+        """
+        for _key, class_map in self._parse_chunks(lines):
+            yield class_map
+
+    def get_parser(self, name):
+        """Get a parser by its name"""
+        if Class_mapsTemplate._parsers is None:
+            Class_mapsTemplate._parsers = dict((p["name"], p) for p in self.PARSERS)
+        return self._parsers[name]
+
+    def render(self, data, parser_name, negate=False):
+        """Render the command of a parser
+
+        Unless the template was created with `compiled=False`, the parser's
+        `compiled_setval` formatter is used instead of its Jinja `setval`
+        template. Parsers without a formatter fall back to the template.
+        """
+        parser = self.get_parser(parser_name)
+        tmplt = parser.get("remval") if negate else None
+        if not tmplt:
+            if self._compiled and parser.get("compiled_setval"):
+                tmplt = parser["compiled_setval"]
+            else:
+                tmplt = parser["setval"]
+        return self._render(tmplt, data, negate)
@@ -23,6 +23,35 @@ notes:
     - Tested against Cisco IOSXE version 17.3 on CML.
     - This module works with connection C(network_cli).
       See L(IOS Platform Options,../network/user_guide/platform_ios.html).
+    - With the environment variable C(ANSIBLE_IOS_CLASS_MAPS_FETCH_NAMES) set to a number, the
+      states C(merged), C(replaced), C(deleted) and C(gathered) with at most that many class-maps
+      in I(config) fetch only those class-maps from the device, one by one. I(before), I(after)
+      and I(gathered) then contain only those class-maps.
+    - With the environment variable C(ANSIBLE_IOS_CLASS_MAPS_CACHE_DIR) set to a directory, the
+      parsed class-maps are cached there, keyed by the hash of their configuration. The least
+      recently used entries are removed once the cache takes more than
+      C(ANSIBLE_IOS_CLASS_MAPS_CACHE_SIZE) bytes, 64MiB by default.
+    - With the environment variables C(ANSIBLE_IOS_CLASS_MAPS_CACHE_DIR) and
+      C(ANSIBLE_IOS_CLASS_MAPS_PROBE) set, the class-maps are read from the cache when the
+      configuration change lines of the running config of the device are the same as on the
+      last run. The device still renders its whole running config to answer the probe, only
+      the transfer and the parsing of the class-maps are saved. The times of these lines are in
+      seconds, a change made in the same second as the last change seen by the previous run
+      is not told apart from it. The cached class-maps of the device are dropped when the
+      module sends commands to it, so its C(after) facts are fetched.
+    - The environment variable C(ANSIBLE_IOS_CLASS_MAPS_PARSE_ENGINE) selects how the lines of
+      the class-maps are parsed, C(regex) (the default) or C(tokenizer). Both give the same
+      facts.
+    - With the environment variable C(ANSIBLE_IOS_CLASS_MAPS_PARALLEL_THRESHOLD) set to a
+      number, running configs with at least that many class-maps are parsed in a pool of
+      C(ANSIBLE_IOS_CLASS_MAPS_PARALLEL_PROCESSES) processes, by default one per CPU. It is
+      off by default, as the pool is only faster with several free CPUs.
+    - With the environment variable C(ANSIBLE_IOS_CLASS_MAPS_DIFF_PROCESSES) set to 2 or more,
+      the commands of more than 500 class-maps are generated in a pool of that many processes.
+      The commands are the same as the serial ones.
+    - With the environment variable C(ANSIBLE_IOS_FACTS_GATHER_THREADS) set to 2 or more, the
+      resource subsets of C(ios_facts) are gathered by a pool of that many threads. Only their
+      fetches from the device overlap, they are parsed one at a time.
 options:
     config:
         description: A list of class-maps represented as dictionaries.
@@ -532,6 +561,14 @@ gathered:
   sample: >
     This output will always be in the same format as the
     module argspec.
+fingerprints:
+  description:
+    - A digest of the content of each gathered class-map, keyed by class-map name.
+    - It does not depend on the order of the matches and can be compared between runs to detect drift.
+  returned: when I(state) is C(gathered)
+  type: dict
+  sample:
+    test_1: 5d2b3a8c6f0e1b9d7a4c2e8f1b3d5a7c9e0f2b4d6a8c1e3f5b7d9a0c2e4f6b8d
 parsed:
   description: The device native config provided in I(running_config) option parsed into structured data as per module argspec.
   returned: when I(state) is C(parsed)
@@ -0,0 +1,580 @@
+#
+# (c) 2023, Ansible by Red Hat, inc
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+#
+"""
+Benchmarks of the ios_class_maps resource module on synthetic configurations.
+
+Run them with the collection installed in an ``ansible_collections`` tree:
+
+    python tests/perf/bench_ios_class_maps.py [benchmark ...]
+
+Without arguments every benchmark is run.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from copy import deepcopy
+
+from ansible.module_utils.six.moves import intern
+
+from ansible_collections.cisco.ios.plugins.module_utils.network.ios.config.class_maps.class_maps import (
+    DIFF_PROCESSES_ENV,
+    Class_maps,
+)
+from ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.class_maps.class_maps import (
+    Class_mapsFacts,
+)
+from ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.facts import (
+    FACT_RESOURCE_SUBSETS,
+    GATHER_THREADS_ENV,
+    Facts,
+)
+from ansible_collections.cisco.ios.plugins.module_utils.network.ios.rm_templates.class_maps import (
+    Class_mapsTemplate,
+)
+from ansible_collections.cisco.ios.tests.unit.compat.mock import MagicMock, patch
+from ansible_collections.cisco.ios.tests.unit.modules.network.ios.test_ios_class_maps_template import (
+    VALID_LINES,
+)
+
+MATCH_LINES = [
+    " match access-group {number}",
+    " match access-group name acl-{number}",
+    " match not cos {digit} {other}",
+    " match cos inner {digit}",
+    " match ip dscp af11 {digit} ef",
+    " match dscp default cs1 {digit}",
+    " match vlan {number}",
+    " match not ip precedence {digit} {other}",
+    " match qos-group {digit}",
+    ' match protocol http server "server-{number}.example.com"',
+    " match mpls experimental topmost {digit} {other}",
+    " match input-interface GigabitEthernet{digit}",
+    " match packet length min 100 max 1000",
+    " match destination-address mac 1234.5678.{number:04x}",
+    " match application citrix source cli",
+    " match security-group source tag {number}",
+]
+
+
+def synthetic_config(count, seed=0):
+    """Output of `show running-config partition class-map` with `count` class-maps"""
+    rand = random.Random(seed)
+    lines = ["Building configuration...", "", "Current configuration : 1 bytes", "!"]
+    for index in range(count):
+        lines.append("class-map match-{0} class-{1}".format(rand.choice(["any", "all"]), index))
+        if rand.random() < 0.3:
+            lines.append(" description synthetic class {0}".format(index))
+        for _match in range(rand.randint(1, 5)):
+            lines.append(
+                rand.choice(MATCH_LINES).format(
+                    number=rand.randint(1, 2000), digit=rand.randint(0, 7), other=rand.randint(0, 7)
+                )
+            )
+        lines.append("!")
+    lines.append("end")
+    return "\n".join(lines) + "\n"
+
+
+def timed(func, *args, **kwargs):
+    start = time.time()
+    result = func(*args, **kwargs)
+    return time.time() - start, result
+
+
+def match_lines(match, lines):
+    for line in lines:
+        match(line)
+
+
+def bench_engines(sizes=(1000, 10000, 100000)):
+    """Time to match the lines and to parse them with the regex and tokenizer engines"""
+    print(
+        "{0:>8} {1:>12} {2:>12} {3:>12} {4:>12}".format(
+            "maps", "regex match", "token match", "regex parse", "token parse"
+        )
+    )
+    for size in sizes:
+        lines = synthetic_config(size).splitlines()
+        tmplt = Class_mapsTemplate()
+        regex_match, _none = timed(match_lines, tmplt.match_regex, lines)
+        tokens_match, _none = timed(match_lines, tmplt.match_tokens, lines)
+        regex_parse, regex = timed(Class_mapsTemplate(lines=lines, engine="regex").parse)
+        tokens_parse, tokens = timed(Class_mapsTemplate(lines=lines, engine="tokenizer").parse)
+        if regex != tokens:
+            raise AssertionError("The engines parsed {0} class-maps differently".format(size))
+        print(
+            "{0:>8} {1:>11.3f}s {2:>11.3f}s {3:>11.3f}s {4:>11.3f}s".format(
+                size, regex_match, tokens_match, regex_parse, tokens_parse
+            )
+        )
+
+
+def pathological_lines(line, size):
+    """Long tokens, long separator runs and trailing garbage built around a valid line"""
+    head, _sep, last = line.rpartition(" ")
+    return [
+        line + " " + "x" * size,
+        line + "1" * size + "x",
+        line + " 1" * size + " x",
+        line + " " * size + "x",
+        line + ' "' * size,
+        line + "\t " * size + '"x',
+        head + " " + last * size + "!",
+        head + " " + "1" * size + "-",
+        head + " " + "a1" * size + "-",
+        head + " " + " ".join([last] * size) + " !",
+    ]
+
+
+def match_line(line):
+    for parser in Class_mapsTemplate.PARSERS:
+        parser["getval"].match(line)
+    Class_mapsTemplate(lines=[line]).parse()
+
+
+def bench_pathological(sizes=(1000, 5000, 25000)):
+    """Slowest pathological line around every valid line, matched by every parser
+
+    The time grows linearly with the size of the lines when no parser backtracks.
+    """
+    print("{0:>8} {1:>12}  {2}".format("size", "slowest", "parser"))
+    for size in sizes:
+        slowest = (0, None)
+        for name, line in sorted(VALID_LINES.items()):
+            for bad in pathological_lines(line, size):
+                elapsed, _none = timed(match_line, bad)
+                slowest = max(slowest, (elapsed, name))
+        print("{0:>8} {1:>11.4f}s  {2}".format(size, slowest[0], slowest[1]))
+
+
+def bench_parallel(sizes=(10000, 50000, 100000), processes=(2, 4)):
+    """Time to parse serially and with pools of worker processes"""
+    print(
+        "{0:>8} {1:>12} ".format("maps", "serial")
+        + " ".join("{0:>12}".format("{0} workers".format(count)) for count in processes)
+    )
+    for size in sizes:
+        lines = synthetic_config(size).splitlines()
+        serial, expected = timed(Class_mapsTemplate(lines=lines, threshold=0).parse)
+        times = []
+        for count in processes:
+            elapsed, result = timed(
+                Class_mapsTemplate(lines=lines, threshold=1, processes=count).parse
+            )
+            if result != expected:
+                raise AssertionError("The parallel parse of {0} class-maps differs".format(size))
+            times.append(elapsed)
+        print(
+            "{0:>8} {1:>11.3f}s ".format(size, serial)
+            + " ".join("{0:>11.3f}s".format(elapsed) for elapsed in times)
+        )
+
+
+IMPORTED_MODULES = [
+    "ansible_collections.cisco.ios.plugins.module_utils.network.ios.rm_templates.class_maps",
+    "ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.facts",
+    "ansible_collections.cisco.ios.plugins.module_utils.network.ios.config.class_maps.class_maps",
+]
+
+IMPORT_TIME_RE = re.compile(
+    r"^import time:\s+(?P<self>\d+) \|\s+(?P<cumulative>\d+) \| (?P<name>.*)$"
+)
+
+COMPILED_PATTERNS = """
+from ansible_collections.cisco.ios.plugins.module_utils.network.ios.rm_templates.class_maps import (
+    Class_mapsTemplate,
+)
+tmplt = Class_mapsTemplate()
+tmplt.render({"name": "test", "match_type": "match-any"}, "class-map")
+print(len([p for p in tmplt.PARSERS if p["getval"]._regex is not None]))
+"""
+
+
+def python(*args, **env):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path), **env)
+    process = subprocess.Popen(
+        [sys.executable] + list(args),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        env=env,
+        universal_newlines=True,
+    )
+    stdout, stderr = process.communicate()
+    if process.returncode:
+        raise AssertionError(stderr)
+    return stdout, stderr
+
+
+def import_times(module, **env):
+    """Self and cumulative import times of a module in a fresh interpreter, in us"""
+    _stdout, stderr = python("-X", "importtime", "-c", "import " + module, **env)
+    for line in stderr.splitlines():
+        match = IMPORT_TIME_RE.match(line)
+        if match and match.group("name").strip() == module:
+            return int(match.group("self")), int(match.group("cumulative"))
+    raise AssertionError("{0} was not imported".format(module))
+
+
+def bench_import(runs=20):
+    """Time to import the modules (best of `python -X importtime` runs)
+
+    The `source` imports compile the modules, like the zipped AnsiballZ payload
+    does, the `bytecode` imports load them from a warm `__pycache__`.
+    """
+    cache = tempfile.mkdtemp()
+    modes = [
+        ("source", {"PYTHONDONTWRITEBYTECODE": "1"}),
+        ("bytecode", {"PYTHONDONTWRITEBYTECODE": "", "PYTHONPYCACHEPREFIX": cache}),
+    ]
+    try:
+        print("{0:>9} {1:>12} {2:>12}  {3}".format("mode", "self", "cumulative", "module"))
+        for mode, env in modes:
+            for module in IMPORTED_MODULES:
+                import_times(module, **env)
+                times = [import_times(module, **env) for _run in range(runs)]
+                print(
+                    "{0:>9} {1:>10.1f}ms {2:>10.1f}ms  {3}".format(
+                        mode,
+                        min(t[0] for t in times) / 1000.0,
+                        min(t[1] for t in times) / 1000.0,
+                        module,
+                    )
+                )
+    finally:
+        shutil.rmtree(cache)
+    stdout, _stderr = python("-c", COMPILED_PATTERNS)
+    print("parser patterns compiled by a rendering run: {0}".format(stdout.strip()))
+
+
+PAYLOAD = """
+import base64, io, os, re, sys, zipfile
+from ansible.utils.collection_loader._collection_finder import _AnsibleCollectionFinder
+_AnsibleCollectionFinder()._install()
+from ansible.executor import module_common
+from ansible.parsing.dataloader import DataLoader
+from ansible.template import Templar
+from ansible_collections.cisco.ios.plugins.modules import ios_class_maps
+payload, _style, _shebang = module_common.modify_module(
+    "cisco.ios.ios_class_maps",
+    ios_class_maps.__file__,
+    {},
+    Templar(loader=DataLoader()),
+    task_vars={"ansible_python_interpreter": sys.executable},
+)
+data = base64.b64decode(re.search(b'ZIPDATA = \"\"\"(.*?)\"\"\"', payload, re.DOTALL).group(1))
+print(len(payload), len(zipfile.ZipFile(io.BytesIO(data)).namelist()))
+"""
+
+
+def bench_payload():
+    """Size of the AnsiballZ payload of ios_class_maps"""
+    stdout, _stderr = python("-c", PAYLOAD)
+    print("{0} bytes, {1} files".format(*stdout.split()))
+
+
+NETCOMMON = "ansible_collections.ansible.netcommon.plugins.module_utils.network.common"
+
+
+def generate_commands(state, want, have):
+    """The commands of a Class_maps run, with `have` as the device's class-maps"""
+    module = MagicMock(params={"state": state, "config": want})
+    with patch(NETCOMMON + ".rm_base.resource_module_base.get_resource_connection"), patch(
+        NETCOMMON + ".facts.facts.get_resource_connection"
+    ), patch.object(Class_maps, "get_facts", return_value=have):
+        class_maps = Class_maps(module)
+    class_maps.generate_commands()
+    return class_maps.commands
+
+
+def access_group_class_maps(count, matches, seed=0):
+    """`match-any` class-maps of `matches` access-groups, and their changed copies"""
+    rand = random.Random(seed)
+    have = []
+    want = []
+    for index in range(count):
+        numbers = rand.sample(range(1, 100000), matches)
+        have.append(
+            {
+                "name": "class-{0}".format(index),
+                "match_type": "match-any",
+                "matches": [{"access_group": {"number": number}} for number in numbers],
+            }
+        )
+        # a tenth of the access-groups is replaced, and the order is shuffled
+        numbers = numbers[: matches - matches // 10] + rand.sample(
+            range(100000, 200000), matches // 10
+        )
+        rand.shuffle(numbers)
+        want.append(dict(have[-1], matches=[{"access_group": {"number": n}} for n in numbers]))
+    return want, have
+
+
+def bench_compare(sizes=(100, 500, 2000)):
+    """Time to diff `match-any` class-maps with many `match access-group` lines"""
+    print("{0:>8} {1:>12} {2:>12}".format("matches", "replaced", "commands"))
+    for size in sizes:
+        want, have = access_group_class_maps(10, size)
+        elapsed, commands = timed(generate_commands, "replaced", want, have)
+        print("{0:>8} {1:>11.3f}s {2:>12}".format(size, elapsed, len(commands)))
+
+
+def bench_generate(sizes=(10000, 50000), states=("replaced", "overridden")):
+    """Time to generate the commands of many class-maps"""
+    print("{0:>8} {1:>12} {2:>12}".format("maps", "state", "time"))
+    for size in sizes:
+        want, have = access_group_class_maps(size, 10)
+        # a tenth of the class-maps is removed, and another tenth is new
+        want = want[size // 10 :] + [
+            dict(class_map, name="new-" + class_map["name"]) for class_map in want[: size // 10]
+        ]
+        for state in states:
+            elapsed, _commands = timed(generate_commands, state, want, have)
+            print("{0:>8} {1:>12} {2:>11.3f}s".format(size, state, elapsed))
+
+
+def bench_diff(sizes=(10000, 50000), processes=(2, 4)):
+    """Time to generate the commands serially and with pools of worker processes"""
+    print(
+        "{0:>8} {1:>12} {2:>12} ".format("maps", "state", "serial")
+        + " ".join("{0:>12}".format("{0} workers".format(count)) for count in processes)
+    )
+    for size in sizes:
+        want, have = access_group_class_maps(size, 10)
+        want = want[size // 10 :]
+        for state in ("replaced", "overridden"):
+            serial, expected = timed(generate_commands, state, want, have)
+            times = []
+            for count in processes:
+                with patch.dict(os.environ, {DIFF_PROCESSES_ENV: str(count)}):
+                    elapsed, commands = timed(generate_commands, state, want, have)
+                if commands != expected:
+                    raise AssertionError("The parallel diff of {0} class-maps differs".format(size))
+                times.append(elapsed)
+            print(
+                "{0:>8} {1:>12} {2:>11.3f}s ".format(size, state, serial)
+                + " ".join("{0:>11.3f}s".format(elapsed) for elapsed in times)
+            )
+
+
+class Options(tuple):
+    """The options of a dict, the tuple of their names followed by their values
+
+    The names are sorted, and the tuples of names are shared by the Options
+    with the same names. The Options are read like the dict, with `get()`
+    and `items()`.
+    """
+
+    __slots__ = ()
+
+    def get(self, name, default=None):
+        try:
+            return self[self[0].index(name) + 1]
+        except ValueError:
+            return default
+
+    def items(self):
+        return zip(self[0], self[1:])
+
+
+# the option names of the dicts in their order -> the shared sorted names
+_option_names = {}
+
+
+def freeze(value):
+    """The compact form of a value, the dicts are `Options`, the lists are
+    tuples and the strings are interned, so the repeated ones are shared
+    """
+    if isinstance(value, dict):
+        keys = tuple(value)
+        names = _option_names.get(keys)
+        if names is None:
+            names = _option_names[keys] = tuple(sorted(intern(str(k)) for k in keys))
+        return Options([names] + [freeze(value[k]) for k in names])
+    if type(value) is str:
+        return intern(value)
+    if isinstance(value, list):
+        return tuple([freeze(item) for item in value])
+    return value
+
+
+def thaw(value):
+    """The dicts and lists of a value frozen by `freeze()`"""
+    if isinstance(value, Options):
+        return dict((k, thaw(v)) for k, v in value.items())
+    if isinstance(value, tuple):
+        return [thaw(item) for item in value]
+    return value
+
+
+class Match(Options):
+    """A match of a class-map, in the compact form of `freeze()`"""
+
+    __slots__ = ()
+
+    @classmethod
+    def from_dict(cls, match):
+        return cls(freeze(match))
+
+    def to_dict(self):
+        return thaw(self)
+
+
+class ClassMap(object):
+    """A class-map, its options and its matches in the compact form of `freeze()`
+
+    The class-maps of a device take a fraction of the memory of their dicts.
+    `to_dict()` returns the argspec form of the class-map. The model is only
+    measured here, the module keeps the argspec dicts: converting the changed
+    class-maps back to dicts for `_compare` cost more time than it saved.
+    """
+
+    __slots__ = ("options", "matches")
+
+    def __init__(self, options, matches=None):
+        self.options = options
+        self.matches = matches
+
+    @classmethod
+    def from_dict(cls, class_map):
+        options = dict((k, v) for k, v in class_map.items() if k != "matches")
+        matches = class_map.get("matches")
+        if matches is not None:
+            matches = tuple(Match.from_dict(match) for match in matches)
+        return cls(freeze(options), matches)
+
+    def to_dict(self):
+        class_map = thaw(self.options)
+        if self.matches is not None:
+            class_map["matches"] = [match.to_dict() for match in self.matches]
+        return class_map
+
+    @property
+    def name(self):
+        return self.options.get("name")
+
+
+def traced(func, *args):
+    """The result of `func` and the memory it still holds, in bytes"""
+    tracemalloc.start()
+    try:
+        result = func(*args)
+        return tracemalloc.get_traced_memory()[0], result
+    finally:
+        tracemalloc.stop()
+
+
+def bench_memory(sizes=(10000, 100000)):
+    """Memory of the device's class-maps as dicts and as ClassMaps, and the
+    time to convert the ClassMaps back to dicts"""
+    print("{0:>8} {1:>12} {2:>12} {3:>12}".format("maps", "dicts", "ClassMaps", "to_dict"))
+    for size in sizes:
+        facts = {"ansible_network_resources": {}}
+        Class_mapsFacts(MagicMock()).populate_facts(None, facts, synthetic_config(size))
+        have = facts["ansible_network_resources"]["class_maps"]
+        dicts, _copied = traced(deepcopy, have)
+        models, class_maps = traced(lambda: [ClassMap.from_dict(entry) for entry in have])
+        elapsed, converted = timed(lambda: [entry.to_dict() for entry in class_maps])
+        if converted != have:
+            raise AssertionError("The ClassMaps of {0} class-maps differ".format(size))
+        print(
+            "{0:>8} {1:>10.1f}MB {2:>10.1f}MB {3:>11.3f}s".format(
+                size, dicts / 1e6, models / 1e6, elapsed
+            )
+        )
+
+
+class SlowConnection(object):
+    """A connection answering the class-map commands with `config` and the
+    other ones with nothing, each after `latency` seconds"""
+
+    def __init__(self, config, latency):
+        self.config = config
+        self.latency = latency
+
+    def get(self, command):
+        time.sleep(self.latency)
+        return self.config if "class-map" in command else ""
+
+
+GATHERED_SUBSETS = [
+    "class_maps",
+    "route_maps",
+    "hostname",
+    "snmp_server",
+    "ntp_global",
+    "prefix_lists",
+    "logging_global",
+    "bgp_global",
+]
+
+
+def gather_facts(connection, threads):
+    module = MagicMock(params={"state": "gathered", "gather_network_resources": None})
+    with patch(
+        NETCOMMON + ".facts.facts.get_resource_connection", return_value=connection
+    ), patch.dict(os.environ, {GATHER_THREADS_ENV: str(threads)}):
+        facts = Facts(module)
+        facts.get_network_resources_facts(FACT_RESOURCE_SUBSETS, GATHERED_SUBSETS)
+    if module.fail_json.called:
+        raise AssertionError(module.fail_json.call_args)
+    return facts.ansible_facts
+
+
+def bench_gather(latencies=(0.05, 0.2), threads=(4, 8), size=2000):
+    """Time to gather several resource subsets serially and with pools of threads"""
+    print(
+        "{0:>8} {1:>12} ".format("latency", "serial")
+        + " ".join("{0:>12}".format("{0} threads".format(count)) for count in threads)
+    )
+    config = synthetic_config(size)
+    for latency in latencies:
+        connection = SlowConnection(config, latency)
+        serial, expected = timed(gather_facts, connection, 0)
+        times = []
+        for count in threads:
+            elapsed, facts = timed(gather_facts, connection, count)
+            if facts != expected:
+                raise AssertionError("The facts gathered by {0} threads differ".format(count))
+            times.append(elapsed)
+        print(
+            "{0:>7.2f}s {1:>11.3f}s ".format(latency, serial)
+            + " ".join("{0:>11.3f}s".format(elapsed) for elapsed in times)
+        )
+
+
+BENCHMARKS = {
+    "compare": bench_compare,
+    "diff": bench_diff,
+    "engines": bench_engines,
+    "gather": bench_gather,
+    "generate": bench_generate,
+    "import": bench_import,
+    "memory": bench_memory,
+    "payload": bench_payload,
+    "parallel": bench_parallel,
+    "pathological": bench_pathological,
+}
+
+
+def main(names):
+    for name in names or sorted(BENCHMARKS):
+        print("== {0}: {1}".format(name, BENCHMARKS[name].__doc__.splitlines()[0]))
+        BENCHMARKS[name]()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
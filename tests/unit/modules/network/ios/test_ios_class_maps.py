@@ -8,8 +8,21 @@ from __future__ import absolute_import, division, print_function
 
 __metaclass__ = type
 
+import os
+import random
+
 from textwrap import dedent
 
+from ansible_collections.cisco.ios.plugins.module_utils.network.ios.config.class_maps.class_maps import (
+    DIFF_PROCESSES_ENV,
+    Class_maps,
+)
+from ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.class_maps.class_maps import (
+    FETCH_NAMES_ENV,
+)
+from ansible_collections.cisco.ios.plugins.module_utils.network.ios.rm_templates.class_maps import (
+    class_map_fingerprint,
+)
 from ansible_collections.cisco.ios.plugins.modules import ios_class_maps
 from ansible_collections.cisco.ios.tests.unit.compat.mock import patch
 from ansible_collections.cisco.ios.tests.unit.modules.utils import set_module_args
@@ -613,3 +626,258 @@ class TestIosClassMapsModule(TestIosModule):
             "match not vlan 100",
         ]
         self.assertEqual(sorted(result["commands"]), sorted(commands))
+
+    def test_ios_class_maps_replaced_reordered_matches(self):
+        self.execute_show_command.return_value = dedent(
+            """\
+                class-map match-any test-class
+                 match access-group 10
+                 match access-group 20
+                 match access-group name test_acl
+                 match not cos 1 3
+                 match ip dscp af11 cs1
+                 match access-group 30
+                !
+                end
+            """
+        )
+        module_args = {
+            "config": [
+                {
+                    "name": "test-class",
+                    "match_type": "match-any",
+                    "matches": [
+                        {"dscp": {"dscp_values": ["cs1", "40"], "ip_versions": "ipv4"}},
+                        {"access_group": {"number": 30}},
+                        {"cos": [3, 1, 3], "negate": True},
+                        {"access_group": {"number": 40}},
+                        {"access_group": {"name": "test_acl"}},
+                        {"access_group": {"number": 10}},
+                    ],
+                }
+            ],
+            "state": "replaced",
+        }
+        set_module_args(module_args)
+        result = self.execute_module(changed=True)
+        self.assertEqual(
+            result["commands"],
+            [
+                "class-map match-any test-class",
+                "match access-group 40",
+                "no match access-group 20",
+            ],
+        )
+
+    def test_ios_class_maps_gathered_fingerprints(self):
+        self.execute_show_command.return_value = dedent(
+            """\
+                class-map match-any test-class
+                 match access-group 10
+                 match not cos 1 3
+                class-map match-all test-class2
+                 description empty
+                !
+                end
+            """
+        )
+        set_module_args(dict(state="gathered"))
+        result = self.execute_module(changed=False)
+        self.assertEqual(
+            result["fingerprints"],
+            dict(
+                (class_map["name"], class_map_fingerprint(class_map))
+                for class_map in result["gathered"]
+            ),
+        )
+        self.assertNotEqual(
+            result["fingerprints"]["test-class"], result["fingerprints"]["test-class2"]
+        )
+
+    def test_ios_class_maps_replaced_unchanged_skips_compare(self):
+        self.execute_show_command.return_value = dedent(
+            """\
+                class-map match-any test-class
+                 match access-group 10
+                 match not cos 1 3
+                 match ip dscp af11 cs1
+                class-map match-all test-class2
+                 match vlan 10
+                !
+                end
+            """
+        )
+        set_module_args(
+            dict(
+                config=[
+                    dict(
+                        name="test-class",
+                        match_type="match-any",
+                        matches=[
+                            dict(dscp=dict(dscp_values=["8", "af11"], ip_versions="ipv4")),
+                            dict(cos=[3, 1], negate=True),
+                            dict(access_group=dict(number=10)),
+                        ],
+                    ),
+                    dict(name="test-class2", match_type="match-all", matches=[dict(vlan=20)]),
+                ],
+                state="replaced",
+            )
+        )
+        with patch.object(Class_maps, "_compare", autospec=True, return_value=[]) as compare:
+            self.execute_module(changed=False)
+        self.assertEqual(
+            [call[1]["want"]["name"] for call in compare.call_args_list], ["test-class2"]
+        )
+
+    def test_ios_class_maps_merged_untouched_class_maps(self):
+        self.execute_show_command.return_value = dedent(
+            """\
+                class-map match-any test-class
+                 match access-group 10
+                class-map match-all test-class2
+                 match vlan 10
+                class-map match-all test-class3
+                 match cos 1
+                !
+                end
+            """
+        )
+        set_module_args(
+            dict(
+                config=[
+                    dict(name="test-class2", matches=[dict(vlan=20)]),
+                    dict(name="test-class4", match_type="match-any"),
+                ],
+                state="merged",
+            )
+        )
+        with patch.object(Class_maps, "_compare", autospec=True, return_value=[]) as compare:
+            self.execute_module(changed=False)
+        self.assertEqual(
+            [call[1]["want"]["name"] for call in compare.call_args_list],
+            ["test-class2", "test-class4"],
+        )
+        set_module_args(
+            dict(
+                config=[
+                    dict(name="test-class2", matches=[dict(vlan=20)]),
+                    dict(name="test-class4", match_type="match-any"),
+                ],
+                state="merged",
+            )
+        )
+        result = self.execute_module(changed=True)
+        self.assertEqual(
+            result["commands"],
+            [
+                "class-map match-all test-class2",
+                "match vlan 20",
+                "class-map match-any test-class4",
+            ],
+        )
+
+    def test_ios_class_maps_replaced_fetch_names(self):
+        self.execute_show_command.return_value = dedent(
+            """\
+                class-map match-any test-class
+                 match access-group 10
+                class-map match-all test-class2
+                 match vlan 10
+                class-map match-all test-class3
+                 match cos 1
+                !
+                end
+            """
+        )
+        config = [
+            dict(name="test-class2", match_type="match-all", matches=[dict(vlan=20)]),
+            dict(name="test-class4", match_type="match-any"),
+        ]
+        set_module_args(dict(config=config, state="replaced"))
+        expected = self.execute_module(changed=True)
+        self.assertEqual(len(expected["before"]), 3)
+        for fetch_names, before in (("1", expected["before"]), ("2", expected["before"][1:2])):
+            with patch.dict(os.environ, {FETCH_NAMES_ENV: fetch_names}):
+                set_module_args(dict(config=config, state="replaced"))
+                result = self.execute_module(changed=True)
+            self.assertEqual(result["commands"], expected["commands"])
+            self.assertEqual(result["before"], before)
+
+        with patch.dict(os.environ, {FETCH_NAMES_ENV: "2"}):
+            set_module_args(dict(config=[dict(name="test-class3")], state="gathered"))
+            result = self.execute_module(changed=False)
+        self.assertEqual(
+            result["gathered"],
+            [
+                {
+                    "name": "test-class3",
+                    "class_type": "standard",
+                    "match_type": "match-all",
+                    "matches": [{"cos": [1]}],
+                }
+            ],
+        )
+
+    def test_ios_class_maps_compare_keeps_commands(self):
+        self.execute_show_command.return_value = "class-map match-all test-class\n match vlan 10\n"
+        set_module_args(
+            dict(
+                config=[
+                    dict(name="test-class", match_type="match-all", matches=[dict(vlan=20)]),
+                    dict(name="test-class2", match_type="match-any", matches=[dict(cos=[1])]),
+                ],
+                state="merged",
+            )
+        )
+        diff_pairs = Class_maps._diff_pairs
+
+        def diff_pairs_after(class_maps, pairs):
+            class_maps.commands.append("! generated before")
+            diff_pairs(class_maps, pairs)
+
+        with patch.object(Class_maps, "_diff_pairs", diff_pairs_after):
+            commands = self.execute_module(changed=True)["commands"]
+        self.assertEqual(
+            commands,
+            [
+                "! generated before",
+                "class-map match-all test-class",
+                "match vlan 20",
+                "class-map match-any test-class2",
+                "match cos 1",
+            ],
+        )
+
+    def test_ios_class_maps_parallel_diff(self):
+        rand = random.Random(0)
+        lines = []
+        config = []
+        for index in range(600):
+            name = "test-class{0}".format(index)
+            number, cos, vlan = rand.randint(1, 199), rand.randint(0, 7), rand.randint(1, 4094)
+            lines.extend(
+                [
+                    "class-map match-any {0}".format(name),
+                    " match access-group {0}".format(number),
+                    " match not cos {0}".format(cos),
+                    " match vlan {0}".format(vlan),
+                ]
+            )
+            matches = [dict(access_group=dict(number=number)), dict(cos=[cos], negate=True)]
+            if index % 3:
+                matches.append(dict(vlan=vlan if index % 5 else vlan + 1))
+            if index % 7:
+                name = name if index % 11 else "new-{0}".format(name)
+                config.append(dict(name=name, match_type="match-any", matches=matches))
+        self.execute_show_command.return_value = "\n".join(lines)
+        for state in ("merged", "replaced", "overridden", "deleted"):
+            set_module_args(dict(config=config, state=state))
+            with patch.dict(os.environ, {DIFF_PROCESSES_ENV: ""}):
+                serial = self.execute_module(changed=True)["commands"]
+            set_module_args(dict(config=config, state=state))
+            with patch.dict(os.environ, {DIFF_PROCESSES_ENV: "2"}), patch.object(
+                Class_maps, "SHARD_SIZE", 100
+            ):
+                parallel = self.execute_module(changed=True)["commands"]
+            self.assertEqual(parallel, serial, state)
@@ -0,0 +1,259 @@
+#
+# (c) 2023, Ansible by Red Hat, inc
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+#
+
+from __future__ import absolute_import, division, print_function
+
+
+__metaclass__ = type
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest
+
+from textwrap import dedent
+
+from ansible_collections.cisco.ios.plugins.module_utils.network.ios.config.class_maps.class_maps import (
+    Class_maps,
+)
+from ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.class_maps.cache import (
+    CACHE_DIR_ENV,
+    CACHE_SIZE_ENV,
+    ParseCache,
+)
+from ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.class_maps.class_maps import (
+    PROBE_ENV,
+    Class_mapsFacts,
+)
+from ansible_collections.cisco.ios.plugins.module_utils.network.ios.rm_templates.class_maps import (
+    Class_mapsTemplate,
+)
+from ansible_collections.cisco.ios.tests.unit.compat.mock import MagicMock, patch
+
+
+NETCOMMON = "ansible_collections.ansible.netcommon.plugins.module_utils.network.common"
+
+
+CONFIG = dedent(
+    """\
+    class-map match-all test_1
+     description this is test class
+     match access-group name test_acl
+     match cos 1 2
+    class-map match-any test_2
+     match not vlan 10
+    """
+)
+
+LAST_CHANGE = "! Last configuration change at 10:12:01 UTC Mon Oct 16 2023 by admin\n"
+
+
+class FakeConnection(object):
+    """A device answering the change probe and the class-map partition"""
+
+    def __init__(self, host, indicator, config, port=22, remote_user="admin"):
+        self.options = {"host": host, "port": port, "remote_user": remote_user}
+        self.indicator = indicator
+        self.config = config
+        self.commands = []
+
+    def get_option(self, option):
+        return self.options[option]
+
+    def get(self, command):
+        self.commands.append(command)
+        if command == Class_mapsFacts.PROBE_COMMAND:
+            return self.indicator
+        return self.config
+
+    def edit_config(self, commands):
+        self.commands.extend(commands)
+
+
+def fill(path, start):
+    cache = ParseCache(path, max_size=10**6)
+    for index in range(start, start + 50):
+        cache.set(cache.key(str(index), "1"), [{"name": str(index)}])
+
+
+class TestIosClassMapsCache(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.cache = ParseCache(os.path.join(self.path, "cache"))
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_get_set(self):
+        key = self.cache.key(CONFIG, "1")
+        self.assertIsNone(self.cache.get(key))
+        self.cache.set(key, [{"name": "test_1", "matches": [{"cos": [1, 2]}]}])
+        self.assertEqual(self.cache.get(key), [{"name": "test_1", "matches": [{"cos": [1, 2]}]}])
+        self.assertNotEqual(self.cache.key(CONFIG, "2"), key)
+        self.assertNotEqual(self.cache.key(CONFIG + "!", "1"), key)
+
+    def test_unsupported_values(self):
+        key = self.cache.key(CONFIG, "1")
+        self.cache.set(key, [{"description": (1, 2)}])
+        self.assertIsNone(self.cache.get(key))
+
+    def test_corrupted_entry(self):
+        key = self.cache.key(CONFIG, "1")
+        self.cache.set(key, [])
+        with open(os.path.join(self.cache.path, key + ".json"), "w") as f:
+            f.write("[{")
+        self.assertIsNone(self.cache.get(key))
+
+    def test_lru_eviction(self):
+        self.cache.max_size = 3 * len('[{"name": "0"}]')
+        keys = [self.cache.key(str(index), "1") for index in range(4)]
+        for index, key in enumerate(keys[:3]):
+            self.cache.set(key, [{"name": str(index)}])
+            os.utime(os.path.join(self.cache.path, key + ".json"), (index, index))
+        # reading the oldest entry makes the second one the least recently used
+        self.assertIsNotNone(self.cache.get(keys[0]))
+        self.cache.set(keys[3], [{"name": "3"}])
+        self.assertEqual(
+            [self.cache.get(key) is not None for key in keys], [True, False, True, True]
+        )
+
+    def test_concurrent_writers(self):
+        processes = [
+            multiprocessing.Process(target=fill, args=(self.cache.path, start))
+            for start in (0, 25, 50)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+            self.assertEqual(process.exitcode, 0)
+        self.assertEqual(
+            [self.cache.get(self.cache.key(str(index), "1")) for index in range(100)],
+            [[{"name": str(index)}] for index in range(100)],
+        )
+        self.assertEqual(
+            [name for name in os.listdir(self.cache.path) if name.endswith(".tmp")], []
+        )
+
+    def test_from_env(self):
+        with patch.dict(os.environ):
+            os.environ.pop(CACHE_DIR_ENV, None)
+            self.assertIsNone(ParseCache.from_env())
+            os.environ[CACHE_DIR_ENV] = self.cache.path
+            os.environ[CACHE_SIZE_ENV] = "1000"
+            cache = ParseCache.from_env()
+            self.assertEqual((cache.path, cache.max_size), (self.cache.path, 1000))
+
+    def test_populate_facts_hit(self):
+        module = MagicMock()
+        with patch.dict(os.environ, {CACHE_DIR_ENV: self.cache.path}):
+            facts = {"ansible_network_resources": {}}
+            Class_mapsFacts(module).populate_facts(None, facts, CONFIG)
+            with patch.object(Class_mapsTemplate, "_parse_blocks") as parse_blocks:
+                cached = {"ansible_network_resources": {}}
+                Class_mapsFacts(module).populate_facts(None, cached, CONFIG)
+                self.assertFalse(parse_blocks.called)
+        self.assertEqual(cached, facts)
+        self.assertEqual(
+            [class_map["name"] for class_map in facts["ansible_network_resources"]["class_maps"]],
+            ["test_1", "test_2"],
+        )
+
+    def test_populate_facts_incremental(self):
+        module = MagicMock(_socket_path="/tmp/socket")
+        changed = CONFIG.replace("match not vlan 10", "match not vlan 20")
+        with patch.dict(os.environ, {CACHE_DIR_ENV: self.cache.path}):
+            facts = Class_mapsFacts(module)
+            connection = FakeConnection("10.0.0.1", LAST_CHANGE, CONFIG)
+            facts.populate_facts(connection, {"ansible_network_resources": {}})
+            self.assertEqual(facts.counters, {"cached": 0, "parsed": 2})
+
+            # the next playbook run has another socket for the same device
+            module._socket_path = "/tmp/other"
+            facts = Class_mapsFacts(module)
+            connection = FakeConnection("10.0.0.1", LAST_CHANGE, changed)
+            incremental = {"ansible_network_resources": {}}
+            facts.populate_facts(connection, incremental)
+            self.assertEqual(facts.counters, {"cached": 1, "parsed": 1})
+
+            facts = Class_mapsFacts(module)
+            connection = FakeConnection("10.0.0.2", LAST_CHANGE, changed + "!\n")
+            facts.populate_facts(connection, {"ansible_network_resources": {}})
+            self.assertEqual(facts.counters, {"cached": 0, "parsed": 2})
+
+        full = {"ansible_network_resources": {}}
+        Class_mapsFacts(module).populate_facts(None, full, changed)
+        self.assertEqual(incremental, full)
+
+    def test_populate_facts_probe(self):
+        module = MagicMock()
+        partition = "show running-config partition class-map"
+        changed = CONFIG.replace("match not vlan 10", "match not vlan 20")
+        connection = FakeConnection("10.0.0.1", LAST_CHANGE, CONFIG)
+        with patch.dict(os.environ, {CACHE_DIR_ENV: self.cache.path, PROBE_ENV: "1"}):
+            facts = {"ansible_network_resources": {}}
+            Class_mapsFacts(module).populate_facts(connection, facts)
+            self.assertEqual(connection.commands, [Class_mapsFacts.PROBE_COMMAND, partition])
+
+            # unchanged, the class-maps are read from the cache
+            connection = FakeConnection("10.0.0.1", LAST_CHANGE, changed)
+            probed = {"ansible_network_resources": {}}
+            Class_mapsFacts(module).populate_facts(connection, probed)
+            self.assertEqual(connection.commands, [Class_mapsFacts.PROBE_COMMAND])
+            self.assertEqual(probed, facts)
+
+            # another device, or a changed config, is fetched
+            for connection in (
+                FakeConnection("10.0.0.2", LAST_CHANGE, changed),
+                FakeConnection("10.0.0.1", LAST_CHANGE, changed, port=2222),
+                FakeConnection("10.0.0.1", LAST_CHANGE, changed, remote_user="operator"),
+                FakeConnection("10.0.0.1", LAST_CHANGE.replace("10:12:01", "10:14:45"), changed),
+            ):
+                probed = {"ansible_network_resources": {}}
+                Class_mapsFacts(module).populate_facts(connection, probed)
+                self.assertEqual(connection.commands, [Class_mapsFacts.PROBE_COMMAND, partition])
+                self.assertEqual(
+                    probed["ansible_network_resources"]["class_maps"][1]["matches"],
+                    [{"vlan": 20, "negate": True}],
+                )
+
+        # the probe is only read when enabled
+        with patch.dict(os.environ, {CACHE_DIR_ENV: self.cache.path, PROBE_ENV: ""}):
+            connection = FakeConnection("10.0.0.1", LAST_CHANGE, CONFIG)
+            Class_mapsFacts(module).populate_facts(connection, {"ansible_network_resources": {}})
+            self.assertEqual(connection.commands, [partition])
+
+    def test_run_commands_forget_device(self):
+        partition = "show running-config partition class-map"
+        command = "class-map match-any test_2"
+        with patch.dict(os.environ, {CACHE_DIR_ENV: self.cache.path, PROBE_ENV: "1"}):
+            for check_mode, commands, fetched in (
+                (False, [], False),
+                (True, [command], False),
+                (False, [command], True),
+            ):
+                connection = FakeConnection("10.0.0.1", LAST_CHANGE, CONFIG)
+                module = MagicMock(params={"state": "merged", "config": []}, check_mode=check_mode)
+                Class_mapsFacts(module).populate_facts(
+                    connection, {"ansible_network_resources": {}}
+                )
+                with patch(
+                    NETCOMMON + ".rm_base.resource_module_base.get_resource_connection",
+                    return_value=connection,
+                ), patch(NETCOMMON + ".facts.facts.get_resource_connection"), patch.object(
+                    Class_maps, "get_facts", return_value=[]
+                ):
+                    class_maps = Class_maps(module)
+                class_maps.commands = commands
+                class_maps.run_commands()
+
+                # the `after` facts, on the same second as the cached ones
+                connection.commands = []
+                Class_mapsFacts(module).populate_facts(
+                    connection, {"ansible_network_resources": {}}
+                )
+                expected = [Class_mapsFacts.PROBE_COMMAND] + ([partition] if fetched else [])
+                self.assertEqual(connection.commands, expected)
@@ -0,0 +1,554 @@
+#
+# (c) 2023, Ansible by Red Hat, inc
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+#
+
+from __future__ import absolute_import, division, print_function
+
+
+__metaclass__ = type
+
+import ast
+import copy
+import os
+import pickle
+import random
+import re
+import unittest
+
+from textwrap import dedent
+
+from ansible_collections.ansible.netcommon.plugins.module_utils.network.common import utils
+from ansible_collections.ansible.netcommon.plugins.module_utils.network.common.rm_base.network_template import (
+    NetworkTemplate,
+)
+from ansible_collections.cisco.ios.plugins.module_utils.network.ios.argspec.class_maps.class_maps import (
+    Class_mapsArgs,
+)
+from ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.class_maps.class_maps import (
+    Class_mapsFacts,
+)
+from ansible_collections.cisco.ios.plugins.module_utils.network.ios.rm_templates.class_maps import (
+    PARALLEL_PROCESSES_ENV,
+    PARALLEL_THRESHOLD_ENV,
+    PARSE_ENGINE_ENV,
+    Class_mapsTemplate,
+    LazyPattern,
+    class_map_fingerprint,
+    class_map_key,
+    dscp_mask,
+    iter_lines,
+    mask_dscp_values,
+    mask_values,
+    match_key,
+    values_mask,
+)
+from ansible_collections.cisco.ios.tests.unit.compat.mock import MagicMock, patch
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+PARSED_CFG = os.path.join(
+    HERE, "../../../../integration/targets/ios_class_maps/tests/cli/_parsed.cfg"
+)
+
+IRREGULAR_LINES = dedent(
+    """\
+    match not any
+    class-map type inspect match-any ignored
+     match vlan10
+     match  cos 1
+     match cos1 2
+     match not not cos 1
+     match not
+     match application attribute
+     match application attribute tcl x
+     match ip dscpef
+    \tmatch\tnot\tip precedence 1
+     match mpls experimental topmost 0 1 2 3 4 5 6 7
+    description before any class-map
+    class-map match-any after
+     match protocol attribute category consumer-internet
+     match protocol http server "example-server.com"
+     match start l2-start offset 10 size 2 eq 0x1 mask 0x2
+    """
+)
+
+REPEATED_BLOCKS = dedent(
+    """\
+    class-map match-all first
+     match vlan 10
+    class-map match-any second
+     description second
+     match cos 1
+    class-map match-any first
+     description repeated
+     match vlan 10
+     match vlan 20
+    """
+)
+
+
+VALID_LINES = {
+    "class-map": "class-map match-any test-class",
+    "description": "  description This is a test description.",
+    "match access group": " match not access-group name test_acl",
+    "match any": " match any",
+    "match application": " match application citrix source cli",
+    "match application attribute": " match application attribute media-type audio-video",
+    "match application group": " match application application-group webex-group",
+    "match class-map": " match class-map test-class",
+    "match cac status": " match cac status admitted",
+    "match cos": " match cos 1 4 6",
+    "match cos inner": " match cos inner 1 2",
+    "match destination mac": " match destination-address mac 1234.5678.9abc",
+    "match discard class": " match discard-class 0",
+    "match object-group security": " match group-object security source test",
+    "match input-interface": " match input-interface GigabitEthernet3",
+    "match dscp": " match dscp default cs1 af31",
+    "match ip dscp": " match ip dscp af11 ef",
+    "match ip precedence": " match not ip precedence 0 1 2",
+    "match ip rtp": " match ip rtp 3000 1000",
+    "match metadata": " match metadata device-model model",
+    "match mpls experimental": " match mpls experimental topmost 0  1  2",
+    "match packet length": " match packet length min 100 max 1000",
+    "match protocol attribute": " match protocol attribute category consumer-internet",
+    "match protocol": ' match protocol http server "example-server.com"',
+    "match qos group": " match qos-group 70",
+    "match security group": " match security-group destination tag 100",
+    "match source mac": " match source-address mac 1234.5678.9abc",
+    "match start eq or neq": " match start l2-start offset 10 size 2 eq 0x1 mask 0x2",
+    "match vlan": " match vlan 100",
+    "match vlan inner": " match vlan inner 20",
+    "match traffic category": " match traffic-category optimize",
+}
+
+
+def unit_fixtures():
+    """Collect the device configurations used by the module unit tests"""
+    fixtures = []
+    with open(os.path.join(HERE, "test_ios_class_maps.py")) as f:
+        tree = ast.parse(f.read())
+    for node in ast.walk(tree):
+        if (
+            isinstance(node, ast.Call)
+            and getattr(node.func, "id", None) == "dedent"
+            and node.args
+            and isinstance(node.args[0], ast.Constant)
+        ):
+            fixtures.append(dedent(node.args[0].value))
+        elif isinstance(node, ast.Dict):
+            for key, value in zip(node.keys, node.values):
+                if getattr(key, "value", None) == "running_config":
+                    fixtures.append(dedent(value.value))
+    return fixtures
+
+
+RENDER_DATA = [
+    {"name": "test"},
+    {"access_group": {"name": "test_acl"}},
+    {"access_group": {}},
+    {"any": False},
+    {"application": {"name": "h323", "version": "test_version"}},
+    {"application": {"name": "citrix", "source": "cli", "version": "1"}},
+    {"application": {"source": "cli"}},
+    {"application_attribute": {"tcl": "business-relevant"}},
+    {"dscp": {"dscp_values": ["0", "46"], "ip_versions": "ipv4-and-ipv6"}},
+    {"dscp": {"dscp_values": ["0", "46"]}},
+    {"input_interface": {"interface_type": "gigabitethernet", "interface_number": 2}},
+    {"metadata": {"cac_status": "admitted"}},
+    {"object_group_security": {"endpoint": "source", "name": "test"}},
+    {"packet_length": {"max": 1500}},
+    {"protocol": {"protocol_name": "dns"}},
+    {"protocol": {"subprotocol_parameter": {"subprotocol_parameter_name": "mime"}}},
+    {"security_group": {"source_tag": 100}},
+    {"security_group": {}},
+]
+
+
+def mutated_lines(count, seed=0):
+    """Valid lines with tokens inserted, removed, replaced or negated"""
+    rand = random.Random(seed)
+    valid = sorted(VALID_LINES.values())
+    tokens = sorted(set(" ".join(valid).split())) + [
+        '"x"',
+        '"',
+        '"a"b"',
+        "not",
+        "10",
+        "12345",
+        "Port-channel10",
+        "Gi0/1",
+    ]
+    lines = []
+    for _i in range(count):
+        line = rand.choice(valid).split()
+        for _j in range(rand.randint(1, 3)):
+            pos = rand.randrange(len(line))
+            action = rand.choice(["insert", "remove", "replace", "negate"])
+            if action == "insert":
+                line.insert(pos, rand.choice(tokens))
+            elif action == "remove" and len(line) > 1:
+                del line[pos]
+            elif action == "replace":
+                line[pos] = rand.choice(tokens)
+            else:
+                line.insert(1, "not")
+        lines.append(rand.choice(["", " ", "  "]) + " ".join(line) + rand.choice(["", " ", "\t"]))
+    return lines
+
+
+def all_fixtures():
+    with open(PARSED_CFG) as f:
+        parsed_cfg = f.read()
+    return unit_fixtures() + [parsed_cfg, IRREGULAR_LINES, REPEATED_BLOCKS]
+
+
+class TestIosClassMapsTemplate(unittest.TestCase):
+    def test_fixtures_found(self):
+        self.assertGreater(len(unit_fixtures()), 10)
+
+    def test_dispatch_index_parity(self):
+        for config in all_fixtures():
+            lines = config.splitlines()
+            tmplt = Class_mapsTemplate(lines=lines)
+            self.assertEqual(tmplt.parse(), NetworkTemplate.parse(tmplt), config)
+
+    def test_compiled_result_parity(self):
+        for config in all_fixtures():
+            lines = config.splitlines()
+            jinja = Class_mapsTemplate(lines=lines, compiled=False).parse()
+            self.assertEqual(Class_mapsTemplate(lines=lines).parse(), jinja, config)
+
+    def test_compiled_setval_parity(self):
+        data = list(RENDER_DATA)
+        for config in all_fixtures():
+            for class_map in Class_mapsTemplate(lines=config.splitlines()).parse().values():
+                data.append(class_map)
+                data.extend(class_map.get("matches", []))
+        data.extend([dict(entry, negate=True) for entry in data])
+
+        jinja = Class_mapsTemplate(compiled=False)
+        compiled = Class_mapsTemplate()
+        for parser in Class_mapsTemplate.PARSERS:
+            if not parser.get("compiled_setval"):
+                continue
+            for entry in [{}] + [entry for entry in data if parser["compval"] in entry]:
+                for negate in (False, True):
+                    self.assertEqual(
+                        compiled.render(entry, parser["name"], negate),
+                        jinja.render(entry, parser["name"], negate),
+                        (parser["name"], entry),
+                    )
+
+    def test_value_lists(self):
+        lines = [
+            "class-map match-any test",
+            " match not cos 7 1 1 3",
+            " match cos inner 5  4",
+            " match ip precedence 210",
+            " match dscp ef af11 cs1 0 1 2 3 4 5 6 ef",
+            " match mpls experimental topmost 0 1 2 3 4 5 6 7 7",
+        ]
+        for compiled in (True, False):
+            parsed = Class_mapsTemplate(lines=lines, compiled=compiled).parse()
+            self.assertEqual(
+                parsed["test"]["matches"],
+                [
+                    {"cos": [1, 3, 7], "negate": True},
+                    {"cos_inner": [4, 5]},
+                    {"ip_precedence": [0, 1, 2]},
+                    {"dscp": {"dscp_values": ["0", "1", "2", "3", "4", "40", "46", "5", "6", "8"]}},
+                    {"mpls_experimental_topmost": [0, 1, 2, 3, 4, 5, 6, 7]},
+                ],
+            )
+
+    def test_dispatch_index_candidates(self):
+        tmplt = Class_mapsTemplate()
+        names = [p["name"] for p in tmplt.get_candidates(" match not ip dscp af11")]
+        self.assertEqual(names, ["match ip dscp", "match ip precedence", "match ip rtp"])
+        names = [p["name"] for p in tmplt.get_candidates(" match cos inner 1")]
+        self.assertEqual(names, ["match cos", "match cos inner"])
+        names = [p["name"] for p in tmplt.get_candidates("class-map match-any test")]
+        self.assertEqual(names, ["class-map"])
+        self.assertEqual(tmplt.get_candidates("!"), [])
+
+    def test_valid_lines(self):
+        for parser in Class_mapsTemplate.PARSERS:
+            self.assertTrue(parser["getval"].match(VALID_LINES[parser["name"]]), parser["name"])
+
+    def test_input_interface_number(self):
+        lines = [
+            "class-map match-any test",
+            " match input-interface Port-channel10",
+            " match not input-interface GigabitEthernet3",
+        ]
+        for compiled in (True, False):
+            parsed = Class_mapsTemplate(lines=lines, compiled=compiled).parse()
+            self.assertEqual(
+                parsed["test"]["matches"],
+                [
+                    {"input_interface": {"interface_type": "port-channel", "interface_number": 10}},
+                    {
+                        "input_interface": {
+                            "interface_type": "gigabitethernet",
+                            "interface_number": 3,
+                        },
+                        "negate": True,
+                    },
+                ],
+            )
+
+    def test_tokenizer_match_parity(self):
+        lines = list(VALID_LINES.values()) + mutated_lines(5000)
+        for config in all_fixtures():
+            lines.extend(config.splitlines())
+        tmplt = Class_mapsTemplate()
+        for line in lines:
+            expected = tmplt.match_regex(line)
+            matched = tmplt.match_tokens(line)
+            if expected is None:
+                self.assertIsNone(matched, line)
+            else:
+                self.assertEqual(matched[0]["name"], expected[0]["name"], line)
+                self.assertEqual(matched[1], expected[1], line)
+
+    def test_tokenizer_parse_parity(self):
+        for config in all_fixtures() + ["\n".join(mutated_lines(500, seed=1))]:
+            lines = config.splitlines()
+            self.assertEqual(
+                Class_mapsTemplate(lines=lines, engine="tokenizer").parse(),
+                NetworkTemplate.parse(Class_mapsTemplate(lines=lines)),
+                config,
+            )
+
+    def test_parse_engine_selection(self):
+        with patch.dict(os.environ):
+            os.environ.pop(PARSE_ENGINE_ENV, None)
+            self.assertEqual(Class_mapsTemplate()._engine, "regex")
+        with patch.dict(os.environ, {PARSE_ENGINE_ENV: "tokenizer"}):
+            self.assertEqual(Class_mapsTemplate()._engine, "tokenizer")
+            self.assertEqual(Class_mapsTemplate(engine="regex")._engine, "regex")
+        with patch.dict(os.environ, {PARSE_ENGINE_ENV: "lex"}):
+            self.assertRaises(ValueError, Class_mapsTemplate)
+
+    def test_iter_lines(self):
+        rand = random.Random(0)
+        pieces = ["a", "bc", " ", "\n", "\r", "\r\n", "\x0b", "\x1c", "\u2028"]
+        for _i in range(500):
+            text = "".join(rand.choice(pieces) for _j in range(rand.randint(0, 30)))
+            chunks = []
+            start = 0
+            while start < len(text):
+                end = start + rand.randint(1, 5)
+                chunks.append(text[start:end])
+                start = end
+            self.assertEqual(list(iter_lines(chunks)), text.splitlines(), repr(text))
+            self.assertEqual(list(iter_lines(text, size=3)), text.splitlines(), repr(text))
+
+    def test_parse_iter(self):
+        def lines():
+            yield "class-map match-any first"
+            yield " match vlan 10"
+            yield "class-map match-all second"
+            raise AssertionError("The first class-map should be yielded before this line")
+
+        self.assertEqual(
+            next(Class_mapsTemplate().parse_iter(lines())),
+            {"name": "first", "match_type": "match-any", "matches": [{"vlan": 10}]},
+        )
+        for config in all_fixtures():
+            names = []
+            for class_map in Class_mapsTemplate().parse_iter(iter_lines(config)):
+                if class_map.get("name") not in names:
+                    names.append(class_map.get("name"))
+            self.assertEqual(names, list(Class_mapsTemplate(lines=config.splitlines()).parse()))
+
+    def test_populate_facts(self):
+        module = MagicMock()
+        for config in all_fixtures():
+            if config == IRREGULAR_LINES:
+                continue
+            tmplt = Class_mapsTemplate(lines=config.splitlines(), module=module)
+            expected = utils.remove_empties(
+                tmplt.validate_config(
+                    Class_mapsArgs.argument_spec, {"config": list(tmplt.parse().values())}
+                )
+            )
+            for batch_size in (1, Class_mapsFacts.BATCH_SIZE):
+                facts = Class_mapsFacts(module)
+                facts.BATCH_SIZE = batch_size
+                ansible_facts = {"ansible_network_resources": {}}
+                facts.populate_facts(None, ansible_facts, config)
+                self.assertEqual(
+                    ansible_facts["ansible_network_resources"].get("class_maps"),
+                    expected.get("config"),
+                    config,
+                )
+
+    def test_split_blocks(self):
+        for config in all_fixtures():
+            lines = config.splitlines()
+            tmplt = Class_mapsTemplate(lines=lines)
+            blocks = list(tmplt.split_blocks())
+            self.assertEqual(sum(blocks, []), lines)
+            parsed = [list(Class_mapsTemplate(lines=block).parse().items()) for block in blocks]
+            self.assertEqual(sum(parsed, []), list(tmplt._parse_blocks()))
+
+    def test_parse_incremental(self):
+        with open(PARSED_CFG) as f:
+            lines = f.read().splitlines()
+        tmplt = Class_mapsTemplate()
+        self.assertEqual(list(tmplt.parse_incremental({}, lines)), list(tmplt.parse_iter(lines)))
+        self.assertEqual(tmplt.counters, {"cached": 0, "parsed": len(tmplt.fragments)})
+
+        changed = [line.replace("match-all", "match-any") for line in lines]
+        self.assertEqual(
+            list(tmplt.parse_incremental(tmplt.fragments, changed)),
+            list(tmplt.parse_iter(changed)),
+        )
+        parsed = len([line for line in lines if line.startswith("class-map match-all")])
+        self.assertGreater(parsed, 0)
+        self.assertEqual(
+            tmplt.counters,
+            {"cached": len(list(tmplt.split_blocks(changed))) - parsed, "parsed": parsed},
+        )
+
+    def test_parse_parallel(self):
+        for config in all_fixtures() + ["\n".join(mutated_lines(500, seed=2))]:
+            lines = config.splitlines()
+            for engine in ("regex", "tokenizer"):
+                tmplt = Class_mapsTemplate(lines=lines, engine=engine, threshold=1, processes=2)
+                tmplt.CHUNK_SIZE = 2
+                self.assertEqual(
+                    tmplt.parse(), NetworkTemplate.parse(Class_mapsTemplate(lines=lines))
+                )
+                self.assertEqual(
+                    list(tmplt.parse_iter(iter_lines(config))),
+                    list(Class_mapsTemplate(threshold=0).parse_iter(lines)),
+                )
+
+    def test_parse_parallel_threshold(self):
+        with open(PARSED_CFG) as f:
+            lines = f.read().splitlines()
+        blocks = len(list(Class_mapsTemplate().split_blocks(lines)))
+        path = "ansible_collections.cisco.ios.plugins.module_utils.network.ios.rm_templates"
+        with patch(path + ".class_maps.fork_context") as context:
+            context.return_value.Pool.side_effect = AssertionError("serial parse expected")
+            for threshold, processes in ((blocks + 1, 2), (0, 2), (1, 1)):
+                tmplt = Class_mapsTemplate(lines=lines, threshold=threshold, processes=processes)
+                self.assertEqual(tmplt.parse(), Class_mapsTemplate(lines=lines).parse())
+            self.assertRaises(
+                AssertionError, Class_mapsTemplate(lines=lines, threshold=blocks, processes=2).parse
+            )
+        with patch.dict(os.environ):
+            os.environ.pop(PARALLEL_THRESHOLD_ENV, None)
+            self.assertEqual(Class_mapsTemplate()._threshold, 0)
+        with patch.dict(os.environ, {PARALLEL_THRESHOLD_ENV: "5", PARALLEL_PROCESSES_ENV: "3"}):
+            tmplt = Class_mapsTemplate()
+            self.assertEqual((tmplt._threshold, tmplt._processes), (5, 3))
+            tmplt = Class_mapsTemplate(threshold=7, processes=1)
+            self.assertEqual((tmplt._threshold, tmplt._processes), (7, 1))
+
+    def test_lazy_pattern(self):
+        for parser in Class_mapsTemplate.PARSERS:
+            self.assertIsInstance(parser["getval"], LazyPattern)
+        source = r"""^\s*match
+            \s(?P<negate>not)?
+            \svlan\s(?P<id>\d+)"""
+        expected = re.compile(source, re.VERBOSE)
+        lines = ("match not vlan 10", " match vlan 10", "match vlan x")
+        pattern = LazyPattern(source, re.VERBOSE)
+        for copied in (copy.deepcopy(pattern), pickle.loads(pickle.dumps(pattern))):
+            self.assertEqual((copied, copied.pattern, copied.flags), (pattern, source, re.VERBOSE))
+
+        def groups(match):
+            return match and match.groupdict()
+
+        for line in lines:
+            self.assertEqual(groups(re.match(pattern, line)), groups(expected.match(line)))
+        self.assertIsNone(pattern._regex)
+        for line in lines:
+            self.assertEqual(groups(pattern.match(line)), groups(expected.match(line)))
+        self.assertIsNotNone(pattern._regex)
+        self.assertEqual(pattern.groupindex, expected.groupindex)
+        self.assertEqual(LazyPattern("a"), "a")
+        self.assertRaises(ValueError, LazyPattern, "a", re.ASCII)
+
+    def test_value_sets(self):
+        rand = random.Random(0)
+        for _i in range(500):
+            values = [rand.randint(0, 7) for _j in range(rand.randint(0, 10))]
+            self.assertEqual(mask_values(values_mask(values, 8)), sorted(set(values)))
+            dscp = [str(rand.randint(0, 63)) for _j in range(rand.randint(0, 10))]
+            self.assertEqual(mask_dscp_values(dscp_mask(dscp)), sorted(set(dscp)))
+        for values in ([8], [-1], [True], ["1"], [None]):
+            self.assertIsNone(values_mask(values, 8), values)
+        for values in (["64"], ["05"], [""], ["af99"], [8], [None]):
+            self.assertIsNone(dscp_mask(values), values)
+        self.assertEqual(mask_dscp_values(dscp_mask(["cs1", "ef", "8", "0"])), ["0", "46", "8"])
+
+    def test_match_key(self):
+        match = {
+            "cos": [2, 1],
+            "dscp": {"dscp_values": ["cs1", "10"], "ip_versions": "ipv4"},
+            "application": {"name": "citrix", "attribute": ["source", "cli"]},
+        }
+        same = {
+            "application": {"attribute": ["source", "cli"], "name": "citrix"},
+            "dscp": {"ip_versions": "ipv4", "dscp_values": ["10", "8", "8"]},
+            "cos": [1, 2, 2],
+        }
+        self.assertEqual(match_key(match), match_key(same))
+        self.assertEqual(len(set([match_key(match), match_key(same)])), 1)
+        for option, value in (
+            ("cos", [1]),
+            ("cos", [1, 2, 9]),
+            ("dscp", {"dscp_values": ["cs1", "10"]}),
+            ("dscp", {"dscp_values": ["cs1", "10", "foo"], "ip_versions": "ipv4"}),
+            ("application", {"name": "citrix", "attribute": ["cli", "source"]}),
+        ):
+            self.assertNotEqual(match_key(dict(match, **{option: value})), match_key(match))
+        self.assertEqual(match_key({"cos": [1, 9, 9]}), match_key({"cos": [1, 9, 9]}))
+        self.assertNotEqual(match_key({"cos": [1, 9, 9]}), match_key({"cos": [1, 9]}))
+
+    def test_class_map_fingerprint(self):
+        class_map = {
+            "name": "test_1",
+            "match_type": "match-all",
+            "description": "this is test class",
+            "matches": [
+                {"access_group": {"name": "test_acl"}},
+                {"cos": [1, 2]},
+                {"dscp": {"dscp_values": ["cs1", "ef"]}},
+            ],
+        }
+        same = {
+            "description": "this is test class",
+            "matches": [
+                {"dscp": {"dscp_values": ["46", "8"]}},
+                {"cos": [2, 1]},
+                {"access_group": {"name": "test_acl"}},
+                {"cos": [1, 2, 2]},
+            ],
+            "match_type": "match-all",
+            "name": "test_1",
+        }
+        self.assertEqual(class_map_key(same), class_map_key(class_map))
+        fingerprint = class_map_fingerprint(class_map)
+        self.assertEqual(len(fingerprint), 64)
+        self.assertEqual(class_map_fingerprint(same), fingerprint)
+        for option, value in (
+            ("name", "test_2"),
+            ("match_type", "match-any"),
+            ("description", None),
+            ("matches", class_map["matches"][1:]),
+            ("matches", class_map["matches"] + [{"vlan": 10}]),
+        ):
+            changed = dict(class_map, **{option: value})
+            self.assertNotEqual(class_map_key(changed), class_map_key(class_map))
+            self.assertNotEqual(class_map_fingerprint(changed), fingerprint)
+        self.assertEqual(
+            class_map_fingerprint({"name": "test_1", "matches": []}),
+            class_map_fingerprint({"name": "test_1"}),
+        )
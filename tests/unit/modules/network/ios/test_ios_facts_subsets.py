@@ -0,0 +1,245 @@
+#
+# (c) 2023, Ansible by Red Hat, inc
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+#
+
+from __future__ import absolute_import, division, print_function
+
+
+__metaclass__ = type
+
+import ast
+import os
+import subprocess
+import sys
+import threading
+import unittest
+
+from textwrap import dedent
+
+from ansible.module_utils.connection import ConnectionError
+from ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.class_maps.class_maps import (
+    FETCH_NAMES_ENV,
+    Class_mapsFacts,
+)
+from ansible_collections.cisco.ios.plugins.module_utils.network.ios.facts.facts import (
+    FACT_RESOURCE_SUBSETS,
+    FACTS_PACKAGE,
+    GATHER_THREADS_ENV,
+    RESOURCE_FACTS_CLASSES,
+    Facts,
+    ResourceFactsSubsets,
+)
+from ansible_collections.cisco.ios.tests.unit.compat.mock import MagicMock, patch
+
+
+IMPORTED_FACTS = """
+import sys
+from {0}.facts import FACT_RESOURCE_SUBSETS
+FACT_RESOURCE_SUBSETS["vlans"]
+print(" ".join(sorted(name for name in sys.modules if name.startswith("{0}."))))
+"""
+
+
+CLASS_MAP_PARTITION = dedent(
+    """\
+    Building configuration...
+
+    Current configuration : 160 bytes
+    !
+    Configuration of Partition - class-map
+    !
+    class-map match-all test_1
+     description this is test class
+     match access-group name test_acl
+    class-map match-any test_2
+     match not vlan 10
+    !
+    end
+    """
+)
+
+
+class GatherState(object):
+    """What the fake subsets of a test see, the fetches of the subsets in
+    `together` wait for each other, they fail if they don't overlap"""
+
+    def __init__(self, together=()):
+        self.together = frozenset(together)
+        self.barrier = threading.Barrier(len(self.together), timeout=10) if together else None
+        self.parsing = threading.Lock()
+        self.parsed = []
+        self.overlapping = []
+
+    def fetch(self, command):
+        if command in self.together:
+            self.barrier.wait()
+        return command
+
+
+class FakeFacts(object):
+    """Facts of a subset named by its class, fetched and parsed in `state`"""
+
+    state = None
+
+    def __init__(self, module):
+        self._module = module
+
+    def populate_facts(self, connection, ansible_facts, data=None):
+        name = type(self).__name__
+        fetched = connection.get(name)
+        parsing = self.state.parsing.acquire(False)
+        try:
+            self.state.parsed.append(name)
+            if name == "failing":
+                raise ValueError("cannot gather {0}".format(name))
+            if name == "exiting":
+                raise SystemExit(3)
+            ansible_facts["ansible_network_resources"].pop(name, None)
+            ansible_facts["ansible_network_resources"].update({name: [fetched]})
+        finally:
+            if parsing:
+                self.state.parsing.release()
+            else:
+                self.state.overlapping.append(name)
+
+
+def fake_facts(state, *names):
+    return dict((name, type(name, (FakeFacts,), {"state": state})) for name in names)
+
+
+class TestIosFactsSubsets(unittest.TestCase):
+    def test_subsets(self):
+        self.assertEqual(len(FACT_RESOURCE_SUBSETS), 24)
+        self.assertEqual(Facts.VALID_RESOURCE_SUBSETS, frozenset(FACT_RESOURCE_SUBSETS))
+        self.assertIs(FACT_RESOURCE_SUBSETS["class_maps"], Class_mapsFacts)
+        self.assertIsNone(FACT_RESOURCE_SUBSETS.get("class_map"))
+        subsets = ResourceFactsSubsets([("vlans", "VlansFacts")])
+        self.assertRaises(KeyError, subsets.__getitem__, "acls")
+
+    def test_finder_imports(self):
+        with open(sys.modules[Facts.__module__].__file__.replace(".pyc", ".py")) as f:
+            tree = ast.parse(f.read())
+        imported = [
+            alias.name
+            for node in tree.body
+            if isinstance(node, ast.If)
+            for child in node.body
+            if isinstance(child, ast.Import)
+            for alias in child.names
+        ]
+        self.assertEqual(
+            imported,
+            ["{0}.{1}.{1}".format(FACTS_PACKAGE, name) for name, _cls in RESOURCE_FACTS_CLASSES],
+        )
+
+    def test_subset_classes(self):
+        self.assertEqual(
+            [name for name, _cls in RESOURCE_FACTS_CLASSES], list(FACT_RESOURCE_SUBSETS)
+        )
+        for name, class_name in RESOURCE_FACTS_CLASSES:
+            self.assertEqual(class_name.lower(), name + "facts")
+        facts = FACT_RESOURCE_SUBSETS["class_maps"]
+        self.assertEqual(facts.__module__, "{0}.class_maps.class_maps".format(FACTS_PACKAGE))
+
+    def test_import_on_first_use(self):
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+        output = subprocess.check_output(
+            [sys.executable, "-c", IMPORTED_FACTS.format(FACTS_PACKAGE)],
+            env=env,
+            universal_newlines=True,
+        )
+        self.assertEqual(
+            [name[len(FACTS_PACKAGE) + 1 :] for name in output.split()],
+            ["facts", "legacy", "legacy.base", "vlans", "vlans.vlans"],
+        )
+
+    def test_class_maps_by_name(self):
+        partition_command = "show running-config partition class-map"
+        first, second = CLASS_MAP_PARTITION.split("class-map match-any")
+        blocks = {"test_1": first, "test_2": "class-map match-any" + second}
+
+        def get(command):
+            if command == partition_command:
+                return CLASS_MAP_PARTITION
+            name = command.split()[-1]
+            if name not in blocks:
+                raise ConnectionError("% class-map {0} not found".format(name))
+            return blocks[name]
+
+        def fetch(name):
+            return "show running-config class-map {0}".format(name)
+
+        partition = {"ansible_network_resources": {}}
+        Class_mapsFacts(MagicMock()).populate_facts(MagicMock(get=get), partition)
+        class_maps = partition["ansible_network_resources"]["class_maps"]
+        test_2 = {"ansible_network_resources": {"class_maps": class_maps[1:]}}
+        for fetch_names, names, commands, facts in (
+            ("", ["test_2"], [partition_command], test_2),
+            ("2", ["test_2"], [fetch("test_2")], test_2),
+            ("2", ["test_2", "test_1"], [fetch("test_1"), fetch("test_2")], partition),
+            ("1", ["test_2", "test_1"], [partition_command], partition),
+            (
+                "2",
+                ["test_3", "test_2"],
+                [fetch("test_2"), fetch("test_3"), partition_command],
+                test_2,
+            ),
+        ):
+            connection = MagicMock()
+            connection.get.side_effect = get
+            gathered = {"ansible_network_resources": {}}
+            with patch.dict(os.environ, {FETCH_NAMES_ENV: fetch_names}):
+                Class_mapsFacts(MagicMock(), names=names).populate_facts(connection, gathered)
+            self.assertEqual([call[0][0] for call in connection.get.call_args_list], commands)
+            self.assertEqual(gathered, facts)
+
+    def gather_resources(self, threads, state, facts_resource_obj_map, resource_facts_type):
+        module = MagicMock(params={"state": "gathered", "gather_network_resources": None})
+        module.fail_json.side_effect = SystemExit(module.fail_json)
+        with patch(
+            "ansible_collections.ansible.netcommon.plugins.module_utils.network.common.facts."
+            "facts.get_resource_connection"
+        ) as get_resource_connection, patch.dict(os.environ, {GATHER_THREADS_ENV: threads}):
+            get_resource_connection.return_value.get.side_effect = state.fetch
+            facts = Facts(module)
+        facts.get_network_resources_facts(facts_resource_obj_map, resource_facts_type)
+        return facts
+
+    def test_threaded_resources_facts(self):
+        names = ("acls", "vlans", "hostname", "lacp", "class_maps")
+        state = GatherState()
+        subsets = fake_facts(state, *names)
+        subsets["lldp_global"] = None
+        serial = self.gather_resources("", state, subsets, ["all"])
+
+        # the fetches of acls and vlans only return once both are running
+        state = GatherState(together=("acls", "vlans"))
+        subsets = fake_facts(state, *names)
+        subsets["lldp_global"] = None
+        threaded = self.gather_resources("4", state, subsets, ["all"])
+        self.assertEqual(sorted(state.parsed), sorted(names))
+        self.assertEqual(state.overlapping, [])
+        self.assertEqual(threaded.ansible_facts, serial.ansible_facts)
+        self.assertEqual(
+            threaded.ansible_facts["ansible_network_resources"],
+            dict((name, [name]) for name in subsets if name != "lldp_global"),
+        )
+        self.assertEqual(
+            threaded._warnings,
+            ["network resource fact gathering for 'lldp_global' is not supported"],
+        )
+
+    def test_threaded_resources_facts_failure(self):
+        state = GatherState()
+        subsets = fake_facts(state, "acls", "failing", "vlans")
+        with self.assertRaises(SystemExit) as context:
+            self.gather_resources("2", state, subsets, ["acls", "failing"])
+        context.exception.code.assert_called_once_with(msg="cannot gather failing")
+
+    def test_threaded_resources_facts_exit(self):
+        state = GatherState()
+        subsets = fake_facts(state, "exiting", "acls", "vlans")
+        with self.assertRaises(SystemExit) as context:
+            self.gather_resources("2", state, subsets, ["exiting", "acls", "vlans"])
+        self.assertEqual(context.exception.code, 3)